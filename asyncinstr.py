@@ -0,0 +1,52 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncInstrument:
+    # awaitable facade over a blocking instrument driver,
+    # calls to one instrument run in order on its own thread, calls to different instruments overlap
+
+    def __init__(self, name, instrument):
+        self.name = name
+        self._instrument = instrument
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'io {name}')
+
+    async def run(self, func, *args):
+        # any blocking work that talks to this instrument, e.g. a whole setup sequence
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def send(self, command):
+        return await self.run(self._instrument.send, command)
+
+    async def query(self, question):
+        return await self.run(self._instrument.query, question)
+
+    async def query_raw(self, question):
+        return await self.run(self._instrument.query_raw, question)
+
+    async def set_lpf_code(self, code):
+        return await self.run(self._instrument.set_lpf_code, code)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class AsyncBench:
+    # AsyncInstrument for every instrument of a controller, closed on exit:
+    #
+    #   async with AsyncBench(instruments) as bench:
+    #       await asyncio.gather(bench['Анализатор'].send(...), bench['Источник питания'].query(...))
+
+    def __init__(self, instruments):
+        self._instruments = {k: AsyncInstrument(k, v) for k, v in instruments.items()}
+
+    def __getitem__(self, item):
+        return self._instruments[item]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        for instrument in self._instruments.values():
+            instrument.close()
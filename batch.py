@@ -0,0 +1,153 @@
+import argparse
+import ast
+import os
+import sys
+import time
+
+from instrumentcontroller import InstrumentController
+from scpirecord import make_replay_bench
+
+# same defaults as the measure widget
+default_secondary = {
+    'Pin': -20,
+    'F1': 0.01,
+    'F2': 6,
+    'kp': -5,
+    'Fborder1': 0.01,
+    'Fborder2': 6,
+    'Fstat': 1.5,
+    'cycles': 1,
+}
+
+
+class BatchRunner:
+    # runs check + measure for a queue of serial numbers on one connected controller
+
+    def __init__(self, controller, device, out_dir='results', on_result=None):
+        self._controller = controller
+        self._device = device
+        self._out_dir = out_dir
+        self._on_result = on_result
+
+        self.passed = list()
+        self.failed = list()
+
+    def run(self, serials):
+        start = time.perf_counter()
+        for serial in serials:
+            part_start = time.perf_counter()
+            try:
+                ok = self.run_one(serial)
+            except KeyboardInterrupt:
+                print('batch interrupted')
+                break
+            except Exception as ex:
+                print(f'{serial}: error during measurement:', ex)
+                ok = False
+
+            (self.passed if ok else self.failed).append(serial)
+            elapsed = time.perf_counter() - start
+            print(f'{serial}: {"ok" if ok else "fail"} in {time.perf_counter() - part_start:.1f} s, '
+                  f'{self.parts_per_hour(elapsed):.1f} parts/h')
+
+        elapsed = time.perf_counter() - start
+        print(f'batch done: {len(self.passed)} ok, {len(self.failed)} failed in {elapsed:.1f} s, '
+              f'{self.parts_per_hour(elapsed):.1f} parts/h')
+        return self.passed, self.failed
+
+    def parts_per_hour(self, elapsed):
+        done = len(self.passed) + len(self.failed)
+        return done / elapsed * 3600 if elapsed else 0.0
+
+    def run_one(self, serial):
+        controller = self._controller
+        params = [self._device, controller.secondaryParams]
+        controller.serial = serial
+
+        controller.check(params)
+        if not controller.present:
+            print(f'{serial}: sample not found')
+            return False
+
+        controller.measure(params)
+        if not controller.hasResult:
+            return False
+
+        self._write_stats(serial, controller.result.stats)
+        if self._on_result is not None:
+            self._on_result(serial, controller.result)
+        return True
+
+    def _write_stats(self, serial, stats):
+        if not self._out_dir:
+            return
+        if not os.path.isdir(self._out_dir):
+            os.makedirs(self._out_dir)
+        with open(os.path.join(self._out_dir, f'{serial}.txt'), mode='wt', encoding='utf-8') as f:
+            f.write(stats)
+
+
+def read_serials(source):
+    f = sys.stdin if source == '-' else open(source, mode='rt', encoding='utf-8')
+    try:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                yield line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def read_params(path):
+    with open(path, mode='rt', encoding='utf-8') as f:
+        return ast.literal_eval(f.read())
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='headless measurement of a queue of parts')
+    parser.add_argument('serials', help='file with one serial number per line, - for stdin')
+    parser.add_argument('--device', default=None, help='device name from the device parameters')
+    parser.add_argument('--secondary', default=None, help='file with the secondary parameters dict')
+    parser.add_argument('--analyzer', default=None, help='analyzer address')
+    parser.add_argument('--source', default=None, help='power source address')
+    parser.add_argument('--programmer', default=None, help='programmer port')
+    parser.add_argument('--record', action='store_true', help='record the scpi conversation of every part')
+    parser.add_argument('--replay', default=None, help='scpi recording to replay instead of the bench instruments')
+    parser.add_argument('--out', default='results', help='directory for the per part stats')
+    parser.add_argument('--main-states', action='store_true', help='measure only the main states')
+    parser.add_argument('--adaptive', action='store_true', help='predict composite states from the bit model')
+    args = parser.parse_args(argv)
+
+    controller = InstrumentController()
+    controller.secondaryParams = dict(default_secondary)
+    if args.secondary:
+        controller.secondaryParams.update(read_params(args.secondary))
+    controller.only_main_states = args.main_states
+    controller.result.only_main_states = args.main_states
+    controller.adaptive_states = args.adaptive
+
+    device = args.device or next(iter(controller.deviceParams))
+
+    if args.replay:
+        controller.use_offline_bench(make_replay_bench(args.replay))
+    if args.record:
+        controller.enable_recording()
+
+    addrs = {k: v.addr for k, v in controller.requiredInstruments.items()}
+    for name, addr in zip(['Анализатор', 'Источник питания', 'Программатор'],
+                          [args.analyzer, args.source, args.programmer]):
+        if addr:
+            addrs[name] = addr
+
+    controller.connect(addrs)
+    if not controller.found:
+        print('connect error, check connection:', controller)
+        return 1
+
+    _, failed = BatchRunner(controller, device, out_dir=args.out).run(read_serials(args.serials))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
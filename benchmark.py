@@ -0,0 +1,216 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from instrumentcontroller import InstrumentController
+from measureresult import MeasureResult
+from scpirecord import make_replay_bench
+from siminstruments import make_sim_bench, SimAnalyzer
+
+device = 'Цифровой аттенюатор'
+
+metrics = ['states_per_second', 'acquisition_time', 'processing_time', 'add_state_time', 'raw_data_time',
+           'peak_memory_mb']
+
+
+def _revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _make_controller(points, only_main_states, cycles, args):
+    # controller on simulated instruments, nothing is archived
+    controller = InstrumentController()
+    if args.replay:
+        controller.use_offline_bench(make_replay_bench(args.replay, timing=bool(args.time_scale),
+                                                       time_scale=args.time_scale))
+    else:
+        controller.use_offline_bench(make_sim_bench(latency=args.latency, time_scale=args.time_scale,
+                                                    point_time=args.point_time, transfer_rate=args.transfer_rate,
+                                                    switch_time=args.switch_time))
+    controller.connect({k: v.addr for k, v in controller.requiredInstruments.items()})
+    controller.archive = None
+    controller.sweep_points = points
+    controller.only_main_states = only_main_states
+    controller.transfer_format = args.format
+    controller.fetch_mode = args.fetch
+    controller.deviceParams[device]['settle'] = args.settle
+    controller.secondaryParams = {
+        'Pin': -10,
+        'F1': 0.01,
+        'F2': 6,
+        'kp': -5,
+        'Fborder1': 0.01,
+        'Fborder2': 6,
+        'Fstat': 1.5,
+        'cycles': cycles,
+    }
+    return controller
+
+
+def bench_acquisition(points, only_main_states, cycles, args):
+    controller = _make_controller(points, only_main_states, cycles, args)
+
+    state_times = list()
+    controller.measureProgress.connect(lambda p: state_times.append(p['state_time']))
+
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    controller.measure([device, None])
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    loop_time = sum(state_times)
+    return {
+        'states_per_second': len(state_times) / loop_time if loop_time else 0.0,
+        'acquisition_time': total,
+        'peak_memory_mb': peak / 1024 / 1024,
+    }
+
+
+def bench_processing(points, only_main_states, repeat=5):
+    # incremental ingestion as the controller does it, per state and for the whole run,
+    # and the whole-run raw_data path for comparison
+    analyzer = SimAnalyzer(time_scale=0)
+    analyzer.points = points
+    codes = MeasureResult.main_states if only_main_states else range(64)
+
+    traces = [analyzer.snp(code) for code in codes]
+    amps = [(code, code * 0.25) for code in codes]
+    secondary = {'kp': -5, 'Fborder1': 0.01, 'Fborder2': 6, 'Fstat': 1.5}
+
+    def ingest():
+        result.begin_run(amps, secondary, points)
+        for code, trace in zip(codes, traces):
+            state_start = time.perf_counter()
+            result.add_state(code, trace)
+            state_timings.append(time.perf_counter() - state_start)
+        result.finish([0.0035, 0.0045], dict())
+        return result.stats
+
+    result = MeasureResult()
+    timings = list()
+    state_timings = list()
+    raw_timings = list()
+    gc.collect()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ingest()
+        timings.append(time.perf_counter() - start)
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result.raw_data = points, traces, amps, secondary, [0.0035, 0.0045], dict()
+        result.stats
+        raw_timings.append(time.perf_counter() - start)
+
+    # memory on a separate pass, tracemalloc slows every allocation down
+    gc.collect()
+    tracemalloc.start()
+    ingest()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'processing_time': min(timings),
+        'add_state_time': float(np.median(state_timings)),
+        'raw_data_time': min(raw_timings),
+        'processing_peak_memory_mb': peak / 1024 / 1024,
+    }
+
+
+def _load_previous(path):
+    previous = dict()
+    if not os.path.isfile(path):
+        return previous
+    with open(path, mode='rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                previous[record['case']] = record
+    return previous
+
+
+def _compare(record, previous):
+    before = previous.get(record['case'])
+    if before is None:
+        return ''
+    changes = list()
+    for key in metrics:
+        if key in record and before.get(key):
+            change = (record[key] - before[key]) / before[key] * 100
+            changes.append(f'{key} {change:+.1f}%')
+    return f'  vs {before["revision"] or before["time"]}: ' + ', '.join(changes)
+
+
+def run(args):
+    previous = _load_previous(args.output)
+    revision = _revision()
+    stamp = datetime.datetime.now().isoformat(timespec='seconds')
+
+    records = list()
+    for points in args.points:
+        for states in args.states:
+            only_main_states = states == 'main'
+            for cycles in args.cycles:
+                case = f'points={points} states={states} cycles={cycles} format={args.format} fetch={args.fetch} scale={args.time_scale}'
+                if args.replay:
+                    case += f' replay={os.path.basename(args.replay)}'
+                print(f'running {case}')
+
+                record = {'case': case, 'time': stamp, 'revision': revision, 'points': points,
+                          'states': states, 'cycles': cycles}
+                if not args.processing_only:
+                    record.update(bench_acquisition(points, only_main_states, cycles, args))
+                record.update(bench_processing(points, only_main_states))
+                records.append(record)
+
+                print(f'  {record.get("states_per_second", 0):.1f} states/s, '
+                      f'acquisition {record.get("acquisition_time", 0):.2f} s, '
+                      f'processing {record["processing_time"] * 1000:.1f} ms '
+                      f'({record["add_state_time"] * 1_000_000:.0f} us/state, '
+                      f'raw_data {record["raw_data_time"] * 1000:.1f} ms), '
+                      f'peak {record.get("peak_memory_mb", record["processing_peak_memory_mb"]):.1f} MiB'
+                      + _compare(record, previous))
+
+    with open(args.output, mode='at', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    print(f'results appended to {args.output}')
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='acquisition and processing benchmark on simulated instruments')
+    parser.add_argument('--points', type=int, nargs='+', default=[201, 1601, 20001])
+    parser.add_argument('--states', nargs='+', choices=['main', 'all'], default=['main', 'all'])
+    parser.add_argument('--cycles', type=int, nargs='+', default=[1])
+    parser.add_argument('--format', default='REAL,64', choices=['ASCII', 'REAL,32', 'REAL,64'])
+    parser.add_argument('--fetch', default='selective', choices=['selective', 'snp'])
+    parser.add_argument('--latency', type=float, default=0.0005, help='per command latency, s')
+    parser.add_argument('--switch-time', type=float, default=0.002, help='programmer switching time, s')
+    parser.add_argument('--point-time', type=float, default=20e-6, help='analyzer sweep time per point, s')
+    parser.add_argument('--transfer-rate', type=float, default=1_000_000, help='bus transfer rate, bytes/s')
+    parser.add_argument('--settle', type=float, default=0.0, help='DUT settle time, s')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='instrument delay multiplier, 0 for CPU only')
+    parser.add_argument('--replay', default=None,
+                        help='scpi recording to replay instead of the simulated bench, timed unless --time-scale 0')
+    parser.add_argument('--processing-only', action='store_true')
+    parser.add_argument('--output', default='bench_results.jsonl')
+    run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
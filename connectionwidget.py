@@ -1,8 +1,8 @@
-from PyQt5 import uic
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, QRunnable, QThreadPool
 from PyQt5.QtWidgets import QWidget
 
 from instrumentwidget import InstrumentWidget
+from uiloader import load_ui
 
 
 class ConnectTask(QRunnable):
@@ -26,7 +26,7 @@ class ConnectionWidget(QWidget):
     def __init__(self, parent=None, controller=None):
         super().__init__(parent=parent)
 
-        self._ui = uic.loadUi('connectionwidget.ui', self)
+        self._ui = load_ui('connectionwidget', self)
         self._controller = controller
         self._threads = QThreadPool()
 
@@ -35,6 +35,8 @@ class ConnectionWidget(QWidget):
             for k, v in self._controller.requiredInstruments.items()
         }
 
+        self._controller.instrumentFound.connect(self.on_instrumentFound)
+
         self._setupUi()
 
     def _setupUi(self):
@@ -45,6 +47,9 @@ class ConnectionWidget(QWidget):
     def on_btnConnect_clicked(self):
         print('connect')
 
+        for w in self._widgets.values():
+            w.status = 'поиск...'
+
         self._threads.start(ConnectTask(self._controller.connect,
                                         self.connectTaskComplete,
                                         {k: w.address for k, w in self._widgets.items()}))
@@ -57,3 +62,7 @@ class ConnectionWidget(QWidget):
         for w, s in zip(self._widgets.values(), self._controller.status):
             w.status = s
         self.connected.emit()
+
+    @pyqtSlot(str, str)
+    def on_instrumentFound(self, name, status):
+        self._widgets[name].status = status
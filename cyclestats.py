@@ -0,0 +1,84 @@
+import warnings
+
+import numpy as np
+
+# rows of a (freq, S11, S21, S22) state trace kept for repeatability
+stat_rows = [1, 2, 3]
+
+
+class CycleStore:
+    # keeps every cycle in a preallocated (cycles x states x params x points) array
+
+    def __init__(self, cycles, states, points, params=len(stat_rows)):
+        self._data = np.full((cycles, states, params, points), np.nan)
+        self._count = np.zeros(states, dtype=int)
+
+    def add(self, cycle, state, values):
+        self._data[cycle, state] = values
+        self._count[state] = max(self._count[state], cycle + 1)
+
+    @property
+    def data(self):
+        return self._data[:self._count.max(initial=0)]
+
+    def summary(self):
+        data = self.data
+        if not len(data):
+            return dict()
+        # reduced state by state, temporaries stay the size of one state's cycles instead of the whole store
+        shape = data.shape[1:]
+        stats = {key: np.empty(shape) for key in ['mean', 'std', 'min', 'max']}
+        with warnings.catch_warnings():
+            # states never measured, e.g. after a cancel or predicted ones, stay nan
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for state in range(shape[0]):
+                values = data[:, state]
+                mean = np.nanmean(values, axis=0, out=stats['mean'][state])
+                np.sqrt(np.nanmean((values - mean) ** 2, axis=0), out=stats['std'][state])
+                np.nanmin(values, axis=0, out=stats['min'][state])
+                np.nanmax(values, axis=0, out=stats['max'][state])
+        return {'count': self._count.copy(), **stats}
+
+
+class WelfordStats:
+    # folds cycles into running mean/variance/min/max, memory does not depend on cycle count
+
+    def __init__(self, cycles, states, points, params=len(stat_rows)):
+        shape = (states, params, points)
+        self._count = np.zeros(states, dtype=int)
+        self._mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        self._min = np.full(shape, np.inf)
+        self._max = np.full(shape, -np.inf)
+
+    def add(self, cycle, state, values):
+        self._count[state] += 1
+        n = self._count[state]
+
+        mean = self._mean[state]
+        delta = values - mean
+        mean += delta / n
+        self._m2[state] += delta * (values - mean)
+
+        np.minimum(self._min[state], values, out=self._min[state])
+        np.maximum(self._max[state], values, out=self._max[state])
+
+    def summary(self):
+        if not self._count.any():
+            return dict()
+        count = np.maximum(self._count, 1)[:, None, None]
+        return {
+            'count': self._count.copy(),
+            'mean': self._mean.copy(),
+            'std': np.sqrt(self._m2 / count),
+            'min': self._min.copy(),
+            'max': self._max.copy(),
+        }
+
+
+def make_cycle_stats(cycles, states, points, max_bytes=256 * 1024 * 1024):
+    size = cycles * states * len(stat_rows) * points * np.dtype(float).itemsize
+    if size <= max_bytes:
+        return CycleStore(cycles, states, points)
+    print(f'keeping {cycles} cycles would take {size // 1024 // 1024} MiB, using running statistics')
+    return WelfordStats(cycles, states, points)
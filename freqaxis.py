@@ -0,0 +1,57 @@
+import numpy as np
+
+GHz = 1_000_000_000
+
+
+class FreqAxis:
+    # sorted frequency grid of a result, frequencies are stored in Hz and queried in GHz
+
+    def __init__(self, freqs):
+        self._freqs = np.asarray(freqs, dtype=float)
+        self._masks = dict()
+
+    def __len__(self):
+        return len(self._freqs)
+
+    @property
+    def freqs(self):
+        return self._freqs
+
+    def index(self, freq):
+        # nearest grid point, binary search
+        freq = np.asarray(freq, dtype=float) * GHz
+        right = np.clip(np.searchsorted(self._freqs, freq), 1, len(self._freqs) - 1)
+        left = right - 1
+        nearest = np.where(freq - self._freqs[left] <= self._freqs[right] - freq, left, right)
+        return int(nearest) if nearest.ndim == 0 else nearest
+
+    def interp(self, values, freq):
+        # linear interpolation of `values` (..., points) at one or several frequencies, nan outside the axis
+        freq = np.asarray(freq, dtype=float) * GHz
+        right = np.clip(np.searchsorted(self._freqs, freq), 1, len(self._freqs) - 1)
+        left = right - 1
+        span = self._freqs[right] - self._freqs[left]
+        weight = np.clip(np.divide(freq - self._freqs[left], span, out=np.zeros_like(span), where=span != 0), 0, 1)
+        values = np.asarray(values, dtype=float)
+        result = values[..., left] * (1 - weight) + values[..., right] * weight
+        return np.where(self._inside(freq), result, np.nan)
+
+    def inside(self, freq):
+        # frequencies (GHz) within the swept range
+        return self._inside(np.asarray(freq, dtype=float) * GHz)
+
+    def _inside(self, freq):
+        # 1 Hz tolerance for the GHz -> Hz rounding
+        return (freq >= self._freqs[0] - 1) & (freq <= self._freqs[-1] + 1)
+
+    def band_mask(self, f1, f2):
+        key = (f1, f2)
+        if key not in self._masks:
+            self._masks[key] = (self._freqs >= f1 * GHz) & (self._freqs <= f2 * GHz)
+        return self._masks[key]
+
+    def first_below(self, values, level):
+        below = np.asarray(values) < level
+        if not below.any():
+            return None
+        return int(below.argmax())
@@ -1,3 +1,12 @@
+import glob
 import subprocess
 
-subprocess.run(['pyinstaller', '--onedir', 'measure.py', '--clean'])
+from uiloader import compile_all
+
+# precompiled ui modules are picked up by uiloader.load_ui instead of parsing .ui files at startup
+names = [ui[:-3] for ui in glob.glob('*.ui')]
+compile_all(names)
+
+# load_ui imports ui_<name> dynamically, pyinstaller has to be told to bundle them
+hidden = [arg for name in names for arg in ['--hidden-import', f'ui_{name}']]
+subprocess.run(['pyinstaller', '--onedir', 'measure.py', '--clean'] + hidden)
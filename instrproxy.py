@@ -0,0 +1,43 @@
+class InstrumentProxy:
+    # wraps an instrument driver, calls of `methods` go through _call(), other attributes pass through
+
+    methods = ['send', 'query', 'query_raw', 'set_lpf_code']
+
+    def __init__(self, name, instrument):
+        self._name = name
+        self._instrument = instrument
+
+    def __getattr__(self, item):
+        attr = getattr(self._instrument, item)
+        if item not in self.methods:
+            return attr
+
+        def call(*args, **kwargs):
+            return self._call(item, attr, args, kwargs)
+
+        return call
+
+    def _call(self, method, func, args, kwargs):
+        return func(*args, **kwargs)
+
+    def __bool__(self):
+        return bool(self._instrument)
+
+    def __str__(self):
+        return str(self._instrument)
+
+    def __repr__(self):
+        return repr(self._instrument)
+
+
+class InstanceFactory:
+    # stands in for the instrument factories of InstrumentController.requiredInstruments,
+    # find() hands out the same ready-made instrument at the configured address
+
+    def __init__(self, instrument):
+        self._instrument = instrument
+        self.addr = instrument.addr
+
+    def find(self):
+        self._instrument.addr = self.addr
+        return self._instrument
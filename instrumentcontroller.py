@@ -1,11 +1,32 @@
+import asyncio
+import datetime
+import functools
+import queue
+import threading
 import time
 
+import numpy as np
+
 from os.path import isfile
-from PyQt5.QtCore import QObject, pyqtSlot
+from PyQt5.QtCore import QObject, pyqtSlot, pyqtSignal
 
 from arduino.programmerfactory import ProgrammerFactory
+from asyncinstr import AsyncBench
 from instr.instrumentfactory import NetworkAnalyzerFactory, SourceFactory, mock_enabled
-from measureresult import MeasureResult
+from measureresult import MeasureResult, calc_vswr, snp_rows, trace_rows
+from resultarchive import ResultArchive
+from scpiblock import parse_ascii, parse_block, make_block, data_formats, byte_orders
+from statepipeline import StatePipeline
+from cyclestats import make_cycle_stats, stat_rows
+from measureprogress import MeasureProgress
+from scpitracer import ScpiTracer, TracedInstrument
+from scpirecord import ScpiRecorder, RecordedInstrument
+from segmentsweep import build_segments, segment_points
+from statemodel import BitModel, is_single_bit, sample_states
+
+
+# analyzer settings overwritten by activating a cal set with its stimulus
+stimulus_keys = ['SENS1:SWE:TYPE', 'SENS1:SWE:POIN', 'SENS1:FREQ:STAR', 'SENS1:FREQ:STOP', 'SENS1:SEGM']
 
 
 class InstrumentController(QObject):
@@ -15,6 +36,12 @@ class InstrumentController(QObject):
 
     main_states = [0, 1, 2, 4, 8, 16, 32, 63]
 
+    # emitted from the acquisition pipeline thread for every parsed state
+    stateMeasured = pyqtSignal(object)
+    measureProgress = pyqtSignal(dict)
+    # emitted from discovery threads as soon as each instrument is found, missing or timed out
+    instrumentFound = pyqtSignal(str, str)
+
     def __init__(self, parent=None):
         super().__init__(parent=parent)
 
@@ -23,6 +50,15 @@ class InstrumentController(QObject):
             'Источник питания': SourceFactory('GPIB0::5::INSTR'),
             'Программатор': ProgrammerFactory('COM5')
         }
+        # sample data mock of the instrument factories, off for this controller once an offline bench is used
+        self.mock_enabled = mock_enabled
+
+        # per instrument discovery timeouts, seconds
+        self.discovery_timeouts = {
+            'Анализатор': 5,
+            'Источник питания': 5,
+            'Программатор': 3,
+        }
 
         self.deviceParams = {
             'Цифровой аттенюатор': {
@@ -31,7 +67,8 @@ class InstrumentController(QObject):
                 'P1': 15,
                 'P2': 21,
                 'Istat': [None, None, None],
-                'Idyn': [None, None, None]
+                'Idyn': [None, None, None],
+                'settle': 0.05
             },
         }
 
@@ -51,27 +88,88 @@ class InstrumentController(QObject):
         }
 
         self.sweep_points = 201
+
+        # 'linear': sweep_points evenly from F1 to F2, 'segment': the same sweep_points budget spent
+        # densely over Fborder1..Fborder2, spot_points over spot_span around every device spot frequency
+        # and sparse_step elsewhere, GHz
+        self.sweep_type = 'linear'
+        self.segment_params = {
+            'sparse_step': 0.1,
+            'spot_points': 11,
+            'spot_span': 0.05,
+        }
+        self._points = self.sweep_points
         self.cal_set = '-20db_pyatkin_6G'
 
+        # trace transfer format: 'REAL,64', 'REAL,32' or 'ASCII', byte order: 'SWAP' (little endian) or 'NORM'
+        self.transfer_format = 'REAL,64'
+        self.byte_order = 'SWAP'
+        self._transfer_format = 'ASCII'
+
+        # 'selective': formatted S11, S21, S22 traces only (measureresult.trace_rows), frequency axis once per run,
+        # 'snp': the full CALC1:DATA:SNP? 2 block for every state
+        self.fetch_mode = 'selective'
+        self._stimulus = np.empty(0)
+
+        # 'single': triggered sweep per state synchronized with *OPC?, 'cont': free running sweep with fixed delays
+        self.sweep_mode = 'single'
+        self.settle_time = 0.05
+        # power source output settling before the current readback, s
+        self.current_settle = 0.5
+
+        # last analyzer configuration sent by _init, SCPI header -> value
+        self._applied = dict()
+        self.force_reset = False
+
         self._instruments = dict()
         self.found = False
         self.present = False
         self.hasResult = False
         self.only_main_states = False
 
+        # measure single-bit states, verify the bit model on `verify_fraction` of the composite states
+        # and predict the rest, falling back to all states when S21 misses by more than the threshold, dB
+        self.adaptive_states = False
+        self.verify_fraction = 0.125
+        self.prediction_threshold = 0.3
+        self._predicted = dict()
+
+        self.cancelled = False
+        self._cancel = threading.Event()
+
         self.result = MeasureResult()
 
+        # the result archive reads its index when opened, so it is opened with the first stored result,
+        # `archive = None` switches archiving off
+        self.archive_path = './archive'
+        self._archive = None
+        self.serial = ''
+
+        # opt-in SCPI latency tracing, see enable_tracing()
+        self.tracer = None
+        self.trace_dir = './traces'
+
+        # opt-in recording of every instrument call for offline replay, see enable_recording() and scpirecord
+        self.recorder = None
+        self.record_dir = './recordings'
+
         self._freqs = list()
         self._mag_s11s = list()
         self._mag_s22s = list()
         self._mag_s21s = list()
         self._phs_s21s = list()
-        self._amp_values = list()
         self._current = [0.0, 0.0]
+        self._traces = dict()
+        self._cycle_stats = None
 
     def __str__(self):
         return f'{self._instruments}'
 
+    def use_offline_bench(self, factories):
+        # simulated or replayed instruments answer every call themselves, the sample data mock must not
+        self.mock_enabled = False
+        self.requiredInstruments = factories
+
     def connect(self, addrs):
         print(f'searching for {addrs}')
         for k, v in addrs.items():
@@ -79,11 +177,100 @@ class InstrumentController(QObject):
         self.found = self._find()
 
     def _find(self):
-        self._instruments = {
-            k: v.find() for k, v in self.requiredInstruments.items()
-        }
+        # all instruments are searched concurrently, a missing one only costs its own timeout,
+        # searches run in daemon threads, so a driver hung in find() does not hold up the exit of the app
+        found = {k: None for k in self.requiredInstruments}
+        results = queue.Queue()
+        timed_out = set()
+        lock = threading.Lock()
+
+        def search(name, factory):
+            try:
+                instrument, error = factory.find(), None
+            except Exception as ex:
+                instrument, error = None, ex
+            with lock:
+                if name not in timed_out:
+                    results.put((name, instrument, error))
+                    return
+            _release(name, instrument)
+
+        start = time.monotonic()
+        deadlines = {k: start + self.discovery_timeouts.get(k, 5) for k in self.requiredInstruments}
+        for name, factory in self.requiredInstruments.items():
+            threading.Thread(target=search, args=(name, factory), name=f'find {name}', daemon=True).start()
+
+        pending = set(deadlines)
+        while pending:
+            timeout = max(0.0, min(deadlines[k] for k in pending) - time.monotonic())
+            try:
+                name, instrument, error = results.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                pending.discard(name)
+                if error is not None:
+                    print(f'error searching for {name}:', error)
+                found[name] = instrument
+                status = getattr(instrument, 'status', 'нет подключения') if instrument else 'не найден'
+                self.instrumentFound.emit(name, str(status))
+
+            now = time.monotonic()
+            with lock:
+                for name in [k for k in pending if deadlines[k] <= now]:
+                    pending.discard(name)
+                    timed_out.add(name)
+                    print(f'{name} not found in {self.discovery_timeouts.get(name, 5)} s')
+                    self.instrumentFound.emit(name, 'таймаут')
+
+        # searches that ended between their timeout and the end of the loop
+        while True:
+            try:
+                name, instrument, _ = results.get_nowait()
+            except queue.Empty:
+                break
+            _release(name, instrument)
+
+        self._instruments = found
+        self.reset_config()
+        if self.recorder is not None:
+            self._record_instruments()
+        if self.tracer is not None:
+            self._trace_instruments()
         return all(self._instruments.values())
 
+    def enable_tracing(self, enabled=True):
+        if not enabled:
+            self.tracer = None
+            self._instruments = {k: v._instrument if isinstance(v, TracedInstrument) else v
+                                 for k, v in self._instruments.items()}
+            return
+        if self.tracer is None:
+            self.tracer = ScpiTracer()
+        self._trace_instruments()
+
+    def _trace_instruments(self):
+        self._instruments = {k: self.tracer.wrap(k, v) for k, v in self._instruments.items()}
+
+    def enable_recording(self, enabled=True):
+        # the recorder sits right on the drivers, under the tracer, so replays include no tracing overhead
+        tracer = self.tracer
+        self.enable_tracing(False)
+        if not enabled:
+            self.recorder = None
+            self._instruments = {k: v._instrument if isinstance(v, RecordedInstrument) else v
+                                 for k, v in self._instruments.items()}
+        else:
+            if self.recorder is None:
+                self.recorder = ScpiRecorder()
+            self._record_instruments()
+        if tracer is not None:
+            self.tracer = tracer
+            self._trace_instruments()
+
+    def _record_instruments(self):
+        self._instruments = {k: self.recorder.wrap(k, v) for k, v in self._instruments.items()}
+
     def check(self, params):
         print(f'call check with {params}')
         device, secondary = params
@@ -101,110 +288,398 @@ class InstrumentController(QObject):
     def measure(self, params):
         print(f'call measure with {params}')
         device, _ = params
-        self.result.raw_data = self.sweep_points, self._measure(device), self._amp_values, self.secondaryParams, self._current
+        self._cancel.clear()
+        if self.tracer is not None:
+            self.tracer.clear()
+        if self.recorder is not None:
+            self.recorder.clear()
+
+        self.result.spot_freqs = self.deviceParams[device].get('F', list())
+        self._measure(device)
+        self.cancelled = self._cancel.is_set()
+
+        start = time.perf_counter()
+        self.result.finish(self._current, self._cycle_stats.summary())
         self.hasResult = bool(self.result)
+        self._trace_span('process result', start)
+        if not self.hasResult:
+            print('no states measured')
+            return
+
+        self._archive_result()
+        self._export_trace()
+        self._save_recording()
+
+    def _trace_span(self, name, start):
+        if self.tracer is not None:
+            self.tracer.span(name, start, time.perf_counter())
+
+    def _export_trace(self):
+        if self.tracer is None:
+            return
+        print(self.tracer.report())
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        try:
+            self.tracer.export_chrome_trace(f'{self.trace_dir}/run_{stamp}.json')
+        except OSError as ex:
+            print('error writing trace:', ex)
+
+    def _save_recording(self):
+        if self.recorder is None:
+            return
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        try:
+            self.recorder.save(f'{self.record_dir}/run_{stamp}.scpi.npz')
+        except OSError as ex:
+            print('error writing scpi recording:', ex)
+
+    def cancel(self):
+        # checked between states, the partial result is kept
+        print('cancel requested')
+        self._cancel.set()
+
+    def _archive_result(self):
+        if not self.hasResult:
+            return
+        try:
+            if self.archive is not None:
+                self.archive.append(self.result, serial=self.serial)
+        except OSError as ex:
+            print('error writing result archive:', ex)
 
     def _measure(self, device):
         param = self.deviceParams[device]
         secondary = self.secondaryParams
         print(f'launch measure with {param} {secondary}')
 
-        self._clear()
-        self._init()
+        try:
+            asyncio.run(self._prepare(param))
+            self._measure_s_params(param)
+        except Exception:
+            # instrument state is unknown after a failure
+            self.reset_config()
+            raise
+
+    async def _prepare(self, param):
+        # the analyzer setup overlaps with the current readback,
+        # which needs the part in its reset state, so the programmer reset comes first
+        async with AsyncBench(self._instruments) as bench:
+            _, self._current = await asyncio.gather(
+                bench['Анализатор'].run(self._init, param),
+                self._read_currents(bench['Источник питания'], bench['Программатор']),
+            )
+        print('read current: ', self._current)
+
+    async def _read_currents(self, src, prog):
+        await prog.set_lpf_code(0)
+
+        # both outputs settle at once, then are read back one after the other
+        for output in [1, 2]:
+            await src.send(f'inst:sel outp{output}')
+            await src.send('apply 5.25v,15ma')
+        if not self.mock_enabled:
+            await asyncio.sleep(self.current_settle)
 
-        return self._measure_s_params()
+        currents = list()
+        for output in [1, 2]:
+            await src.send(f'inst:sel outp{output}')
+            currents.append(float(await src.query('MEAS:CURR?')))
 
-    def _clear(self):
-        self._amp_values.clear()
+        for output in [1, 2]:
+            await src.send(f'inst:sel outp{output}')
+            await src.send('apply 4.75v,15ma')
 
-    def _init(self):
+        if self.mock_enabled:
+            return [0.0035, 0.0045]
+        return currents
+
+    def _init(self, param):
         pna = self._instruments['Анализатор']
-        prog = self._instruments['Программатор']
 
-        pna.send('SYST:PRES')
-        pna.query('*OPC?')
+        if self.force_reset or not self._applied:
+            pna.send('SYST:PRES')
+            pna.query('*OPC?')
+            self._applied = {'SYST:PRES': True}
+            self.force_reset = False
         # pna.send('SENS1:CORR ON')
 
-        pna.send('CALC1:PAR:DEF "CH1_S21",S21')
+        if self.fetch_mode == 'selective':
+            self._define_measurements(pna)
+        else:
+            self._apply(pna, 'CALC1:PAR:DEF', '"CH1_S21",S21')
 
         # c:\program files\agilent\newtowrk analyzer\UserCalSets
-        pna.send(f'SENS1:CORR:CSET:ACT "{self.cal_set}",1')
+        # ',1' also applies the cal set's own stimulus, so the sweep settings are sent again after it
+        if self._apply(pna, 'SENS1:CORR:CSET:ACT', f'"{self.cal_set}",1'):
+            for key in stimulus_keys:
+                self._applied.pop(key, None)
         # pna.send('SENS2:CORR:CSET:ACT "-20dBm_1.1-1.4G",1')
 
-        pna.send(f'SENS1:SWE:POIN {self.sweep_points}')
-
-        pna.send(f'SENS1:FREQ:STAR {self.secondaryParams["F1"]}GHz')
-        pna.send(f'SENS1:FREQ:STOP {self.secondaryParams["F2"]}GHz')
-
-        pna.send('SENS1:SWE:MODE CONT')
-        pna.send(f'FORM:DATA ASCII')
+        if self.sweep_type == 'segment' and self.mock_enabled:
+            print('segmented sweep is not available with mock sample data, using linear sweep')
+        if self.sweep_type == 'segment' and not self.mock_enabled:
+            self._init_segments(pna, param)
+        else:
+            self._points = self.sweep_points
+            self._apply(pna, 'SENS1:SWE:TYPE', 'LIN')
+            self._apply(pna, 'SENS1:SWE:POIN', self.sweep_points)
+
+            self._apply(pna, 'SENS1:FREQ:STAR', f'{self.secondaryParams["F1"]}GHz')
+            self._apply(pna, 'SENS1:FREQ:STOP', f'{self.secondaryParams["F2"]}GHz')
+
+        if self.sweep_mode == 'single':
+            self._apply(pna, 'SENS1:SWE:MODE', 'HOLD')
+        else:
+            self._apply(pna, 'SENS1:SWE:MODE', 'CONT')
+
+        self._transfer_format = self._select_transfer_format(pna)
+        self._apply(pna, 'FORM:DATA', self._transfer_format)
+        if self._transfer_format != 'ASCII':
+            self._apply(pna, 'FORM:BORD', self.byte_order)
+
+    def _init_segments(self, pna, param):
+        secondary = self.secondaryParams
+        segments = build_segments(secondary['F1'], secondary['F2'],
+                                  (secondary['Fborder1'], secondary['Fborder2']),
+                                  param.get('F', list()),
+                                  self.sweep_points,
+                                  **self.segment_params)
+        self._points = segment_points(segments)
+        print(f'segmented sweep: {len(segments)} segments, {self._points} points')
+
+        if self._applied.get('SENS1:SEGM') != segments:
+            pna.send('SENS1:SEGM:DEL:ALL')
+            for i, (start, stop, points) in enumerate(segments, start=1):
+                pna.send(f'SENS1:SEGM{i}:ADD')
+                pna.send(f'SENS1:SEGM{i}:FREQ:STAR {start}GHz')
+                pna.send(f'SENS1:SEGM{i}:FREQ:STOP {stop}GHz')
+                pna.send(f'SENS1:SEGM{i}:SWE:POIN {points}')
+                pna.send(f'SENS1:SEGM{i} ON')
+            self._applied['SENS1:SEGM'] = segments
+        self._apply(pna, 'SENS1:SWE:TYPE', 'SEGM')
+
+    def _define_measurements(self, pna):
+        for name in trace_rows:
+            meas = f'"CH1_{name}"'
+            if self._apply(pna, 'CALC1:PAR:DEF', f'{meas},{name}', key=f'CALC1:PAR:DEF {meas}'):
+                pna.send(f'CALC1:PAR:SEL {meas}')
+                pna.send('CALC1:FORM MLOG')
+
+    def _apply(self, pna, header, value, key=None):
+        # sends a setting only if it differs from what was last applied to the analyzer
+        key = key or header
+        if key in self._applied and self._applied[key] == value:
+            return False
+        pna.send(f'{header} {value}')
+        self._applied[key] = value
+        return True
 
-        prog.set_lpf_code(0)
+    def reset_config(self):
+        # the next run presets the analyzer and sends the whole setup again
+        self._applied = dict()
 
-    def _measure_s_params(self):
+    def _measure_s_params(self, param):
         pna = self._instruments['Анализатор']
-        prog = self._instruments['Программатор']
         src = self._instruments['Источник питания']
 
-        src.send('inst:sel outp1')
-        src.send('apply 5.25v,15ma')
-        if not mock_enabled:
-            time.sleep(0.5)
-        cur1 = float(src.query('MEAS:CURR?'))
-
-        src.send('inst:sel outp2')
-        src.send('apply 5.25v,15ma')
-        if not mock_enabled:
-            time.sleep(0.5)
-        cur2 = float(src.query('MEAS:CURR?'))
-
-        self._current = [cur1, cur2]
-        if mock_enabled:
-            self._current = [0.0035, 0.0045]
-        print('read current: ', self._current)
+        settle = param.get('settle', self.settle_time)
 
-        src.send('inst:sel outp1')
-        src.send('apply 4.75v,15ma')
-        src.send('inst:sel outp2')
-        src.send('apply 4.75v,15ma')
+        states = [(amp, code) for amp, code in self.states.items()
+                  if not self.only_main_states or code in self.main_states]
 
-        cycles = self.secondaryParams['cycles']
-        out = list()
-        for cycle in range(cycles):
-            print('measure cycle:', cycle)
+        if self.fetch_mode == 'selective':
+            # the axis does not change between states, only the traces are transferred per state
+            self._stimulus = self._parse_trace(self._fetch_stimulus(pna))
 
-            out.clear()
-            self._amp_values.clear()
+        cycles = self.secondaryParams['cycles']
+        self._cycle_stats = make_cycle_stats(cycles, len(states), self._points)
+        progress = MeasureProgress(cycles, len(states))
+        self.result.begin_run([(code, amp) for amp, code in states], self.secondaryParams, self._points)
+        try:
+            with StatePipeline(self._parse_snp, self._store_state) as pipeline:
+                for cycle in range(cycles):
+                    if self._cancel.is_set():
+                        break
+                    print('measure cycle:', cycle)
+
+                    pipeline.drain()
+                    self._traces.clear()
+                    self._predicted.clear()
+                    self.result.begin_cycle()
+
+                    measure_states = functools.partial(self._measure_states, pipeline, progress, cycle, states, settle)
+                    if self.adaptive_states:
+                        self._measure_adaptive(pipeline, progress, measure_states, states)
+                    else:
+                        measure_states(range(len(states)))
+
+                    pipeline.drain()
+                    self.result.predicted = dict(self._predicted)
+                    self.result.end_cycle()
+        finally:
+            src.send('*RST')
+
+    def _measure_states(self, pipeline, progress, cycle, states, settle, indices):
+        pna = self._instruments['Анализатор']
+        prog = self._instruments['Программатор']
 
-            for amp, code in self.states.items():
-                if self.only_main_states and code not in self.main_states:
-                    continue
-                self._amp_values.append((code, amp))
+        for index in indices:
+            amp, code = states[index]
+            if self._cancel.is_set():
+                print(f'measure cancelled at cycle {cycle}, state {code}')
+                return False
 
-                prog.set_lpf_code(code)
+            prog.set_lpf_code(code)
 
-                if not mock_enabled:
-                    time.sleep(0.5)
+            self._trigger_sweep(pna, settle)
 
+            if self.fetch_mode != 'selective':
                 pna.send(f'CALC1:PAR:SEL "CH1_S21"')
                 pna.query('*OPC?')
-                res = pna.query(f'CALC1:DATA:SNP? 2')
 
-                # pna.send(f'CALC:DATA:SNP:PORTs:Save "1,2", "d:/ksa/att_simple/s{code}.s2p"')
-                # pna.send(f'MMEM:STOR "d:/ksa/att_simple1/s{code}.s2p"')
+            # pna.send(f'CALC:DATA:SNP:PORTs:Save "1,2", "d:/ksa/att_simple/s{code}.s2p"')
+            # pna.send(f'MMEM:STOR "d:/ksa/att_simple1/s{code}.s2p"')
+
+            # parsing and storing of this state overlaps with switching and sweeping the next one
+            pipeline.submit(cycle, index, code, self._fetch_state(pna, code))
+
+            if self.sweep_mode != 'single' and not self.mock_enabled:
+                time.sleep(0.5)
+
+            self.measureProgress.emit(progress.step(cycle, index, code))
+        return True
 
-                # with open(f's2p_{code}.s2p', mode='wt', encoding='utf-8') as f:
-                #     f.write(res)
-                if mock_enabled:
-                    with open(f'ref/sample_data/s2p_{code}.s2p', mode='rt', encoding='utf-8') as f:
-                        res = list(f.readlines())[0].strip()
-                out.append(parse_float_list(res))
+    def _measure_adaptive(self, pipeline, progress, measure_states, states):
+        # single-bit states first, then a verification sample of composite states against the bit model,
+        # the rest is predicted unless the model misses by more than `prediction_threshold` dB of S21,
+        # only S21 is predicted, S11 and S22 of predicted states are nan and stay out of the VSWR statistics
+        codes = [code for _, code in states]
+        bits = max(codes).bit_length()
+        base = [i for i, code in enumerate(codes) if is_single_bit(code)]
+        if len(base) < bits + 1:
+            print('not every single-bit state is measured, adaptive coverage is off')
+            return measure_states(range(len(states)))
+
+        if not measure_states(base):
+            return False
+        pipeline.drain()
+
+        model = BitModel.fit({codes[i]: self._traces[i][2] for i in base}, bits=bits)
+        composites = [i for i in range(len(states)) if i not in base]
+        verify = sample_states(composites, self.verify_fraction)
+        if not measure_states(verify):
+            return False
+        pipeline.drain()
+
+        error = max([model.error(codes[i], self._traces[i][2]) for i in verify] or [0.0])
+        rest = [i for i in composites if i not in verify]
+        if error > self.prediction_threshold:
+            print(f'bit model error {error:.3f} dB over {self.prediction_threshold} dB, measuring all states')
+            return measure_states(rest)
+
+        print(f'bit model error {error:.3f} dB, predicting {len(rest)} states')
+        progress.skip(len(rest))
+        freqs = self._traces[base[0]][0]
+        unknown = np.full_like(freqs, np.nan)
+        for i in rest:
+            self._traces[i] = np.vstack([freqs, unknown, model.predict(codes[i]), unknown])
+            self.result.add_state(codes[i], self._traces[i])
+            self._predicted[codes[i]] = error
+        return True
 
-                if not mock_enabled:
-                    time.sleep(0.5)
+    def _store_state(self, cycle, index, code, trace):
+        self._traces[index] = trace
+        self.result.add_state(code, trace)
+
+        self._cycle_stats.add(cycle, index, trace[stat_rows])
+
+        self.stateMeasured.emit({
+            'cycle': cycle,
+            'index': index,
+            'code': code,
+            'freqs': trace[0],
+            's21': trace[2],
+            'vswr_in': calc_vswr(trace[1]),
+            'vswr_out': calc_vswr(trace[3]),
+        })
+
+    def _trigger_sweep(self, pna, settle):
+        if self.sweep_mode != 'single':
+            if not self.mock_enabled:
+                time.sleep(0.5)
+            return
+
+        if not self.mock_enabled and settle:
+            time.sleep(settle)
+        # *OPC? returns only after the single sweep has completed
+        pna.send('SENS1:SWE:MODE SING')
+        pna.query('*OPC?')
 
-        src.send('*RST')
-        return out
+    def _select_transfer_format(self, pna):
+        fmt = self.transfer_format
+        if fmt not in data_formats or self.byte_order not in byte_orders:
+            print(f'unsupported transfer format {fmt} {self.byte_order}, falling back to ASCII')
+            return 'ASCII'
+        if fmt != 'ASCII' and not self.mock_enabled and not hasattr(pna, 'query_raw'):
+            print('analyzer driver has no raw query, falling back to ASCII')
+            return 'ASCII'
+        return fmt
+
+    def _fetch_state(self, pna, code):
+        if self.fetch_mode != 'selective':
+            return self._fetch_snp(pna, code)
+
+        if self.mock_enabled:
+            snp = np.reshape(self._read_mock(code), (9, -1))
+            return {name: self._encode_mock(snp[snp_rows[row]]) for name, row in trace_rows.items()}
+
+        raws = dict()
+        for name in trace_rows:
+            pna.send(f'CALC1:PAR:SEL "CH1_{name}"')
+            raws[name] = self._query_trace(pna, 'CALC1:DATA? FDATA')
+        return raws
+
+    def _fetch_stimulus(self, pna):
+        if self.mock_enabled:
+            return self._encode_mock(np.reshape(self._read_mock(0), (9, -1))[0])
+        return self._query_trace(pna, 'SENS1:X?')
+
+    def _fetch_snp(self, pna, code):
+        if self.mock_enabled:
+            return self._encode_mock(self._read_mock(code))
+        return self._query_trace(pna, 'CALC1:DATA:SNP? 2')
+
+    def _query_trace(self, pna, question):
+        if self._transfer_format == 'ASCII':
+            return pna.query(question)
+        return pna.query_raw(question)
+
+    def _read_mock(self, code):
+        with open(f'ref/sample_data/s2p_{code}.s2p', mode='rt', encoding='utf-8') as f:
+            return parse_float_list(list(f.readlines())[0].strip())
+
+    def _encode_mock(self, values):
+        if self._transfer_format == 'ASCII':
+            return ','.join(str(v) for v in values)
+        return make_block(values, self._transfer_format, self.byte_order)
+
+    def _parse_trace(self, raw):
+        if self._transfer_format == 'ASCII':
+            return parse_ascii(raw)
+        return parse_block(raw, self._transfer_format, self.byte_order)
+
+    def _parse_snp(self, cycle, index, code, raw):
+        # every state becomes a (freq, S11, S21, S22) x points array
+        start = time.perf_counter()
+        if self.fetch_mode == 'selective':
+            trace = np.empty((len(snp_rows), len(self._stimulus)))
+            trace[0] = self._stimulus
+            for name, row in trace_rows.items():
+                trace[row] = self._parse_trace(raw[name])
+        else:
+            trace = np.reshape(self._parse_trace(raw), (-1, self._points))[snp_rows]
+        self._trace_span(f'parse state {code}', start)
+        return cycle, index, code, trace
 
     def pow_sweep(self):
         print('pow sweep')
@@ -218,6 +693,30 @@ class InstrumentController(QObject):
     def status(self):
         return [i.status for i in self._instruments.values()]
 
+    @property
+    def archive(self):
+        if self._archive is None and self.archive_path:
+            self._archive = ResultArchive(self.archive_path)
+        return self._archive
+
+    @archive.setter
+    def archive(self, archive):
+        self._archive = archive
+        if archive is None:
+            self.archive_path = None
+
+
+def _release(name, instrument):
+    # an instrument found after its search timed out is closed, so its port is free for the next connect
+    close = getattr(instrument, 'close', None)
+    if close is None:
+        return
+    print(f'{name} found after its timeout, closing it')
+    try:
+        close()
+    except Exception as ex:
+        print(f'error closing {name}:', ex)
+
 
 def parse_float_list(lst):
     return [float(x) for x in lst.split(',')]
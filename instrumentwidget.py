@@ -1,13 +1,14 @@
-from PyQt5 import uic
 from PyQt5.QtWidgets import QWidget
 
+from uiloader import load_ui
+
 
 class InstrumentWidget(QWidget):
 
     def __init__(self, parent=None, title='stub', addr='stub'):
         super().__init__(parent=parent)
 
-        self._ui = uic.loadUi('instrumentwidget.ui', self)
+        self._ui = load_ui('instrumentwidget', self)
 
         self.title = title
         self.address = addr
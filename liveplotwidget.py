@@ -0,0 +1,140 @@
+import numpy as np
+
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from PyQt5.QtWidgets import QWidget, QVBoxLayout
+
+
+class LivePlotWidget(QWidget):
+    # single axes matplotlib widget with the same drawing calls as mytools PlotWidget,
+    # plus artists which are updated in place and redrawn by blitting
+
+    def __init__(self, parent=None, toolbar=False):
+        super().__init__(parent=parent)
+
+        self._figure = Figure()
+        self._canvas = FigureCanvasQTAgg(self._figure)
+        self._axes = self._figure.add_subplot(111)
+
+        self._layout = QVBoxLayout()
+        self._layout.setContentsMargins(0, 0, 0, 0)
+        if toolbar:
+            self._layout.addWidget(NavigationToolbar2QT(self._canvas, self))
+        self._layout.addWidget(self._canvas)
+        self.setLayout(self._layout)
+
+        self._artists = dict()
+        self._collections = dict()
+        self._background = None
+        self._canvas.mpl_connect('draw_event', self._on_draw)
+
+    @property
+    def axes(self):
+        return self._axes
+
+    @property
+    def canvas(self):
+        return self._canvas
+
+    def set_tight_layout(self, value):
+        self._figure.set_tight_layout(value)
+
+    def subplots_adjust(self, *args, **kwargs):
+        self._figure.subplots_adjust(*args, **kwargs)
+
+    def tight_layout(self, *args, **kwargs):
+        self._figure.tight_layout(*args, **kwargs)
+
+    def set_xlabel(self, *args, **kwargs):
+        self._axes.set_xlabel(*args, **kwargs)
+
+    def set_ylabel(self, *args, **kwargs):
+        self._axes.set_ylabel(*args, **kwargs)
+
+    def grid(self, b=None, **kwargs):
+        # passed positionally, newer matplotlib renamed the keyword to `visible`
+        self._axes.grid(b, **kwargs)
+
+    def plot(self, *args, **kwargs):
+        lines = self._axes.plot(*args, **kwargs)
+        self._canvas.draw_idle()
+        return lines
+
+    def clear(self):
+        self._axes.clear()
+        self._artists.clear()
+        self._collections.clear()
+        self._background = None
+        self._canvas.draw_idle()
+
+    def redraw(self):
+        self._canvas.draw_idle()
+
+    def set_segments(self, key, segments, **kwargs):
+        # a whole family of curves as one artist, (curves x points x 2) array
+        collection = self._collections.get(key)
+        if collection is None:
+            collection = LineCollection(segments, **kwargs)
+            self._axes.add_collection(collection, autolim=False)
+            self._collections[key] = collection
+        else:
+            collection.set_segments(segments)
+            collection.update(kwargs)
+
+        points = np.reshape(segments, (-1, 2))
+        points = points[np.isfinite(points).all(axis=1)]
+        self._axes.ignore_existing_data_limits = True
+        if len(points):
+            self._axes.update_datalim(points)
+        self._axes.autoscale_view()
+        return collection
+
+    def collection(self, key):
+        return self._collections.get(key)
+
+    def drop_lines(self):
+        for artist in self._artists.values():
+            artist.remove()
+        self._artists.clear()
+        self._background = None
+
+    def update_line(self, key, xs, ys, **kwargs):
+        line = self._artists.get(key)
+        if line is None:
+            line, = self._axes.plot(xs, ys, animated=True, **kwargs)
+            self._artists[key] = line
+            self._background = None
+        else:
+            line.set_data(xs, ys)
+
+        if not self._fits(xs, ys):
+            self._background = None
+        return line
+
+    def _fits(self, xs, ys):
+        if not len(xs):
+            return True
+        x0, x1 = self._axes.get_xlim()
+        y0, y1 = self._axes.get_ylim()
+        return x0 <= min(xs) and max(xs) <= x1 and y0 <= min(ys) and max(ys) <= y1
+
+    def _on_draw(self, event):
+        self._background = self._canvas.copy_from_bbox(self._axes.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self._artists.values():
+            self._axes.draw_artist(artist)
+
+    def blit(self):
+        if self._background is None:
+            # limits or artists changed, a full redraw also grabs a new background
+            self._axes.relim(visible_only=True)
+            self._axes.autoscale_view()
+            self._canvas.draw()
+            return
+
+        self._canvas.restore_region(self._background)
+        self._draw_artists()
+        self._canvas.blit(self._axes.bbox)
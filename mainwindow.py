@@ -1,14 +1,13 @@
-from PyQt5 import uic
 from PyQt5.QtWidgets import QMainWindow
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot, QModelIndex
 
-from formlayout.formlayout import fedit
 from instrumentcontroller import InstrumentController
 from connectionwidget import ConnectionWidget
 from measuremodel import MeasureModel
 from measurewidget import MeasureWidgetWithSecondaryParameters
 from primaryplotwidget import PrimaryPlotWidget
 from statwidget import StatWidget
+from uiloader import load_ui
 
 
 class MainWindow(QMainWindow):
@@ -24,7 +23,7 @@ class MainWindow(QMainWindow):
         self.setAttribute(Qt.WA_DeleteOnClose)
 
         # create instance variables
-        self._ui = uic.loadUi('mainwindow.ui', self)
+        self._ui = load_ui('mainwindow', self)
         self._instrumentController = InstrumentController(parent=self)
         self._connectionWidget = ConnectionWidget(parent=self, controller=self._instrumentController)
         self._measureWidget = MeasureWidgetWithSecondaryParameters(parent=self, controller=self._instrumentController)
@@ -51,6 +50,8 @@ class MainWindow(QMainWindow):
         self._measureWidget.measureComplete.connect(self._measureModel.update)
         self._measureWidget.measureComplete.connect(self.on_measureComplete)
 
+        self._instrumentController.stateMeasured.connect(self._plotWidget.on_stateMeasured)
+
         # self._ui.tableMeasure.setModel(self._measureModel)
 
         self.refreshView()
@@ -87,18 +88,24 @@ class MainWindow(QMainWindow):
 
     @pyqtSlot()
     def on_actParams_triggered(self):
+        from formlayout.formlayout import fedit
+
         data = [
             ('Корректировка', self._instrumentController.result.adjust),
             ('Калибровка', self._instrumentController.cal_set),
             ('Только основные', self._plotWidget.only_main_states),
+            ('Предсказание состояний', self._instrumentController.adaptive_states),
             ('Набор для коррекции', [1, '+25', '+85', '-60']),
+            ('Трассировка SCPI', self._instrumentController.tracer is not None),
+            ('Запись SCPI', self._instrumentController.recorder is not None),
+            ('Полный сброс анализатора', self._instrumentController.force_reset),
         ]
 
         values = fedit(data=data, title='Параметры')
         if not values:
             return
 
-        adjust, cal_set, only_main_states, adjust_set = values
+        adjust, cal_set, only_main_states, adaptive_states, adjust_set, tracing, recording, force_reset = values
 
         self._instrumentController.result.adjust = adjust
         self._instrumentController.result.adjust_set = adjust_set
@@ -106,4 +113,8 @@ class MainWindow(QMainWindow):
         self._instrumentController.only_main_states = only_main_states
         self._instrumentController.result.only_main_states = only_main_states
         self._plotWidget.only_main_states = only_main_states
+        self._instrumentController.adaptive_states = adaptive_states
+        self._instrumentController.enable_tracing(tracing)
+        self._instrumentController.enable_recording(recording)
+        self._instrumentController.force_reset = force_reset
 
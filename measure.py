@@ -1,5 +1,10 @@
+import time
+
+startup_start = time.perf_counter()
+
 import sys
 
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication
 from mainwindow import MainWindow
 
@@ -8,6 +13,8 @@ def main(args):
     app = QApplication(args)
     window = MainWindow()
     window.show()
+    # fires once the event loop has started and the window is up
+    QTimer.singleShot(0, lambda: print(f'startup time: {time.perf_counter() - startup_start:.2f} s'))
     sys.exit(app.exec_())
 
 
@@ -0,0 +1,44 @@
+import collections
+import time
+
+
+class MeasureProgress:
+    # per-state timing and a rolling ETA over the last `window` states
+
+    def __init__(self, cycles, states, window=16):
+        self._cycles = cycles
+        self._states = states
+        self._durations = collections.deque(maxlen=window)
+        self._start = time.perf_counter()
+        self._last = self._start
+        self._done = 0
+        self._skipped = 0
+
+    @property
+    def total(self):
+        return self._cycles * self._states - self._skipped
+
+    def skip(self, count):
+        # states that will not be measured, e.g. predicted ones
+        self._skipped += count
+
+    def step(self, cycle, index, code):
+        now = time.perf_counter()
+        state_time = now - self._last
+        self._last = now
+        self._durations.append(state_time)
+        self._done += 1
+
+        per_state = sum(self._durations) / len(self._durations)
+        return {
+            'cycle': cycle,
+            'cycles': self._cycles,
+            'state': index,
+            'states': self._states,
+            'code': code,
+            'done': self._done,
+            'total': self.total,
+            'state_time': state_time,
+            'elapsed': now - self._start,
+            'eta': per_state * (self.total - self._done),
+        }
@@ -1,32 +1,36 @@
 import random
 
+import numpy as np
 
-def calc_vswr(in_mags: list):
-    temp = map(lambda x: x / 20, in_mags)
-    modulated = list(map(lambda x: pow(10, x), temp))
-    plus = map(lambda x: 1 + x, modulated)
-    minus = map(lambda x: 1 - x, modulated)
-    out = map(lambda x: x[0] / x[1], zip(plus, minus))
-    return list(out)
+from freqaxis import FreqAxis
+from touchstone import load_adjust_set
+
+
+# rows of the CALC1:DATA:SNP? 2 block kept for processing: freq and S11, S21, S22 magnitudes
+snp_rows = [0, 1, 3, 7]
+# rows of the per state (freq, S11, S21, S22) arrays by measurement name
+trace_rows = {'S11': 1, 'S21': 2, 'S22': 3}
+
+
+def calc_vswr(in_mags):
+    modulated = np.power(10, np.asarray(in_mags) / 20)
+    return (1 + modulated) / (1 - modulated)
 
 
 def calc_error(array, zero, ideal):
-    _, value = ideal
-    value = abs(value)
-    return [abs(abs(a) - abs(z) - value) for a, z in zip(array, zero)]
+    # `ideal` holds the nominal attenuation of every row in `array`
+    ideal = np.abs(np.asarray(ideal, dtype=float))
+    if np.ndim(array) > 1:
+        ideal = ideal[:, None]
+    return np.abs(np.abs(array) - np.abs(zero) - ideal)
 
 
 def shift_vals(values, shift):
-    return [s + shift for s in values]
+    return np.asarray(values) + shift
 
 
 def mul_vals(values, shift):
-    return [s * shift for s in values]
-
-
-def _find_freq_index(freqs: list, freq):
-    freq = freq * 1_000_000_000
-    return min(range(len(freqs)), key=lambda i: abs(freqs[i] - freq))
+    return np.asarray(values) * shift
 
 
 class MeasureResult:
@@ -43,29 +47,26 @@ class MeasureResult:
         self.headers = list()
         self._secondaryParams = dict()
         self._ideal_amp = list()
+        self._current = [0.0, 0.0]
 
-        self._freqs = list()
-        self._s21s = list()
-        self._s21s_err = list()
-        self._s11s = list()
-        self._s22s = list()
-
-        self._vswr_in = list()
-        self._vswr_out = list()
-
-        self._s21_mins = list()
-        self._vswr_in_max = list()
-        self._vswr_out_max = list()
-        self._s21_err_max = list()
-
-        self._kp_freq_min = 0
-        self._kp_freq_max = 0
-
-        self._min_freq_index = 0
-        self._max_freq_index = 0
-
-        self.adjust = False
-        self.only_main_states = False
+        # measured data, everything derived from it is computed on first access and kept in _memo
+        self._freqs = np.empty(0)
+        self._s11s = np.empty((0, 0))
+        self._s21s = np.empty((0, 0))
+        self._s22s = np.empty((0, 0))
+        self._repeatability = dict()
+        self._memo = dict()
+
+        # incremental runs, see begin_run(): code -> row, rows added so far, rows of the last complete cycle
+        self._rows = dict()
+        self._filled = np.zeros(0, dtype=bool)
+        self._complete = None
+
+        self.spot_freqs = list()
+        # code -> bit model verification error, dB, for states predicted instead of measured
+        self.predicted = dict()
+        self._adjust = False
+        self._only_main_states = False
         self._adjust_dir = self.adjust_dirs[1]
         self.ready = False
 
@@ -76,111 +77,96 @@ class MeasureResult:
         self._secondaryParams.clear()
         self._ideal_amp.clear()
 
-        self._freqs.clear()
-        self._s21s.clear()
-        self._s21s_err.clear()
-        self._s11s.clear()
-        self._s22s.clear()
+        self._freqs = np.empty(0)
+        self._s11s = np.empty((0, 0))
+        self._s21s = np.empty((0, 0))
+        self._s22s = np.empty((0, 0))
 
-        self._vswr_in.clear()
-        self._vswr_out.clear()
-
-        self._s21_mins.clear()
-        self._vswr_in_max.clear()
-        self._vswr_out_max.clear()
-        self._s21_err_max.clear()
+        self._current = [0.0, 0.0]
+        self._repeatability = dict()
+        self._rows = dict()
+        self._filled = np.zeros(0, dtype=bool)
+        self._complete = None
+        self.invalidate()
 
-        self._kp_freq_min = 0
-        self._kp_freq_max = 0
+    def invalidate(self):
+        # drops every derived value, the next access recomputes it from the measured data
+        self._memo.clear()
 
-        self._current = [0.0, 0.0]
+    def _cached(self, key, calc):
+        try:
+            return self._memo[key]
+        except KeyError:
+            value = self._memo[key] = calc()
+            return value
 
-    def _process(self):
-        if self.adjust:
-            self._adjust_data('s21')
-        self._calc_vwsr_in()
-        self._calc_vwsr_out()
-        if self.adjust:
-            self._adjust_data('vswr')
-        self._calc_s21_err()
-        if self.adjust:
-            self._adjust_data('err')
-        self._calc_stats()
+    def _source(self):
+        # (freqs, s11, s21, s22) the metrics are derived from: measured, or the adjust set when adjusting
+        if self._adjust:
+            return self._cached('source', self._load_ideal)
+        return self._freqs, self._s11s, self._s21s, self._s22s
 
-        self.ready = True
+    @property
+    def _axis(self):
+        return self._cached('axis', lambda: FreqAxis(self.freqs))
 
-    def _calc_vwsr_in(self):
-        self._vswr_in = [calc_vswr(s) for s in self._s11s]
+    def _calc_s21(self):
+        s21s = self._source()[2]
+        if self._adjust:
+            s21s = shift_vals(s21s, random.uniform(-0.2, 0.2))
+        return s21s
 
-    def _calc_vwsr_out(self):
-        self._vswr_out = [calc_vswr(s) for s in self._s22s]
+    def _calc_vswr(self, mags):
+        vswr = calc_vswr(mags)
+        if self._adjust:
+            vswr = shift_vals(vswr, random.uniform(-0.05, 0.05))
+        return vswr
 
     def _calc_s21_err(self):
-        s21_0 = self._s21s[0]
-        self._s21s_err = [calc_error(s, s21_0, ideal) for s, ideal in zip(self._s21s, self._ideal_amp)]
-
-    def _adjust_data(self, what):
-        if what == 'err':
-            err_mul = random.uniform(0.875, 1.125)
-            self._s21s_err = [mul_vals(s, err_mul) for s in self._s21s_err]
-            self._s21s_ph_err = [mul_vals(s, err_mul) for s in self._s21s_ph_err]
-        elif what == 's21':
-            s21_shift = random.uniform(-0.2, 0.2)
-            self._s21s = [shift_vals(s, s21_shift) for s in self._s21s]
-        elif what == 'vswr':
-            vswr_in_shift = random.uniform(-0.05, 0.05)
-            vswr_out_shift = random.uniform(-0.05, 0.05)
-            self._vswr_in = [shift_vals(s, vswr_in_shift) for s in self._vswr_in]
-            self._vswr_out = [shift_vals(s, vswr_out_shift) for s in self._vswr_out]
-        else:
-            return
-
-    def _calc_stats(self):
-        vs = self._s21s[0]
+        ideal = [value for _, value in self._ideal_amp]
+        s21s = self.s21
+        err = calc_error(s21s, s21s[0], ideal)
+        if self._adjust:
+            err = mul_vals(err, random.uniform(0.875, 1.125))
+        return err
+
+    def _calc_bandwidth(self):
+        # indexes of the first and the last frequency of the working band
+        vs = self.s21[0]
         level = self._secondaryParams['kp']
-        self._min_freq_index = 0
-        try:
-            self._max_freq_index = next(i for i, v in enumerate(vs) if v < level)
-        except Exception as ex:
-            print('error searching for working bandwidth:', ex)
-            self._max_freq_index = len(self._freqs) - 1
-        self._s21_mins = [vs[self._min_freq_index], vs[self._max_freq_index]]
+        max_index = self._axis.first_below(vs, level)
+        if max_index is None:
+            print('error searching for working bandwidth: no point below', level)
+            max_index = len(self.freqs) - 1
+        return 0, max_index
+
+    def _calc_band_max(self):
+        # per-state maximums over Fborder1..Fborder2: vswr in, vswr out, amplitude error
+        mask = self.border_mask
+        if not mask.any():
+            return None
+        return self.vswr_in[:, mask].max(axis=1), self.vswr_out[:, mask].max(axis=1), \
+            self.s21_err[:, mask].max(axis=1)
+
+    @property
+    def border_mask(self):
+        return self._axis.band_mask(self._secondaryParams.get('Fborder1', 0),
+                                    self._secondaryParams.get('Fborder2', 0))
+
+    def at_freqs(self, freqs):
+        # every metric of every state interpolated at all `freqs` (GHz), (states x freqs) arrays
+        values = self._axis.interp(np.stack([self.s21, self.s21_err, self.vswr_in, self.vswr_out]), freqs)
+        return dict(zip(['s21', 's21_err', 'vswr_in', 'vswr_out'], values))
 
     def _load_ideal(self):
         print(f'reading adjust set from: {self.adjust_set}/')
-        for i in range(64):
-            if self.only_main_states and i not in self.main_states:
-                continue
-            with open(f'{self.adjust_set}/s{i}.s2p', mode='rt', encoding='utf-8') as f:
-                fs = []
-                s11dbs = []
-                s11degs = []
-                s21dbs = []
-                s21degs = []
-                s12dbs = []
-                s12degs = []
-                s22dbs = []
-                s22degs = []
-
-                for line in list(f.readlines())[5:]:
-                    res = map(float, line.strip().split())
-                    frq, s11db, s11deg, s21db, s21deg, s12db, s12deg, s22db, s22deg = res
-                    fs.append(frq)
-                    s11dbs.append(s11db)
-                    s11degs.append(s11deg)
-                    s21dbs.append(s21db)
-                    s21degs.append(s21deg)
-                    s12dbs.append(s12db)
-                    s12degs.append(s12deg)
-                    s22dbs.append(s22db)
-                    s22degs.append(s22deg)
-
-            self._s11s.append(s11dbs)
-            self._s21s.append(s21dbs)
-            self._s22s.append(s22dbs)
-
-        self._freqs = fs
-        self._process()
+        codes = [i for i in range(64) if not self._only_main_states or i in self.main_states]
+        freqs, mags = load_adjust_set(self.adjust_set, codes)
+        # the rows of the states in the result, a cancelled run has fewer than the whole set
+        mags = mags[[codes.index(code) for code, _ in self._ideal_amp]]
+
+        # magnitudes are in Touchstone order: S11, S21, S12, S22
+        return freqs, np.array(mags[:, 0]), np.array(mags[:, 1]), np.array(mags[:, 3])
 
     @property
     def raw_data(self):
@@ -192,47 +178,202 @@ class MeasureResult:
         self._init()
 
         points = int(args[0])
-        s2p = list(args[1])
+        s2p = args[1]
         self._ideal_amp = list(args[2])
         self._secondaryParams = dict(args[3])
         self._current = list(args[4])
+        self._repeatability = dict(args[5])
+
+        # states x rows x points, either full 9 row SNP blocks or (freq, S11, S21, S22) traces
+        data = np.asarray(s2p, dtype=float).reshape(len(s2p), -1, points)
+        if data.shape[1] != len(snp_rows):
+            data = data[:, snp_rows]
+        self._freqs = data[0, 0].copy()
+        self._s11s = np.ascontiguousarray(data[:, 1])
+        self._s21s = np.ascontiguousarray(data[:, 2])
+        self._s22s = np.ascontiguousarray(data[:, 3])
+        self.ready = True
+
+    def begin_run(self, amp_values, secondary, points):
+        # incremental alternative to raw_data: add_state() as every state arrives, then finish(),
+        # rows of states not added yet are nan, so stats and plots can be queried mid-run
+        print('begin result')
+        self._init()
+        self.ready = False
 
-        if self.adjust:
-            self._load_ideal()
+        self._ideal_amp = list(amp_values)
+        self._secondaryParams = dict(secondary)
+        self._rows = {code: row for row, (code, _) in enumerate(self._ideal_amp)}
+        self._filled = np.zeros(len(self._ideal_amp), dtype=bool)
+
+        shape = (len(self._ideal_amp), points)
+        self._freqs = np.full(points, np.nan)
+        self._s11s = np.full(shape, np.nan)
+        self._s21s = np.full(shape, np.nan)
+        self._s22s = np.full(shape, np.nan)
+        if not self._adjust:
+            self._memo.update({
+                's21': self._s21s,
+                'vswr_in': np.full(shape, np.nan),
+                'vswr_out': np.full(shape, np.nan),
+                's21_err': np.full(shape, np.nan),
+            })
+
+    def add_state(self, code, trace):
+        # `trace` is a (freq, S11, S21, S22) x points array or a full SNP block of the state `code`
+        row = self._rows[code]
+        trace = np.reshape(np.asarray(trace, dtype=float), (-1, len(self._freqs)))
+        if len(trace) != len(snp_rows):
+            trace = trace[snp_rows]
+
+        first = not self._filled.any()
+        if first:
+            self._freqs[:] = trace[0]
+        self._s11s[row], self._s21s[row], self._s22s[row] = trace[1:]
+        self._filled[row] = True
+
+        self._memo.pop('stats', None)
+        self._memo.pop('bandwidth', None)
+        if first:
+            self._memo.pop('axis', None)
+        if not self._adjust:
+            self._add_metrics(row)
+
+    def _add_metrics(self, row):
+        # derived rows of one state, the error of every state depends on the zero state in row 0
+        memo = self._memo
+        if not all(key in memo for key in ['vswr_in', 'vswr_out', 's21_err']):
+            # invalidated mid-run, the next access recomputes everything
+            for key in ['vswr_in', 'vswr_out', 's21_err', 'band_max']:
+                memo.pop(key, None)
             return
+        memo['vswr_in'][row] = calc_vswr(self._s11s[row])
+        memo['vswr_out'][row] = calc_vswr(self._s22s[row])
+
+        rows = np.flatnonzero(self._filled) if row == 0 else [row] if self._filled[0] else []
+        if len(rows):
+            ideal = [self._ideal_amp[r][1] for r in rows]
+            memo['s21_err'][rows] = calc_error(self._s21s[rows], self._s21s[0], ideal)
+
+        if 'band_max' not in memo:
+            mask = self.border_mask
+            memo['band_max'] = tuple(np.full(len(self._filled), np.nan) for _ in range(3)) if mask.any() else None
+        if memo['band_max'] is not None:
+            mask = self.border_mask
+            vswr_in_max, vswr_out_max, s21_err_max = memo['band_max']
+            vswr_in_max[row] = memo['vswr_in'][row, mask].max()
+            vswr_out_max[row] = memo['vswr_out'][row, mask].max()
+            if len(rows):
+                s21_err_max[rows] = memo['s21_err'][rows][:, mask].max(axis=1)
+
+    def begin_cycle(self):
+        # every measurement cycle refills the rows, a cycle is never mixed with the states of another one
+        self._filled[:] = False
+        for values in [self._s11s, self._s21s, self._s22s]:
+            values.fill(np.nan)
+        for key in ['stats', 'bandwidth', 'band_max']:
+            self._memo.pop(key, None)
+        if not self._adjust:
+            for key in ['vswr_in', 'vswr_out', 's21_err']:
+                if key in self._memo:
+                    self._memo[key].fill(np.nan)
+
+    def end_cycle(self):
+        # a cycle with every state added is kept, a later cancelled cycle falls back to it in finish()
+        if self._filled.all():
+            self._complete = (self._s11s.copy(), self._s21s.copy(), self._s22s.copy(), dict(self.predicted))
+
+    def finish(self, current, repeatability):
+        self._current = list(current)
+        self._repeatability = dict(repeatability)
+        if not self._filled.all() and self._complete is not None:
+            print('cancelled cycle is incomplete, keeping the last complete one')
+            self._s11s, self._s21s, self._s22s, self.predicted = self._complete
+            self._filled[:] = True
+            self.invalidate()
+        if not self._filled.all():
+            # drop states never added, e.g. after a cancel
+            self._ideal_amp = [amp for amp, filled in zip(self._ideal_amp, self._filled) if filled]
+            self._s11s = self._s11s[self._filled]
+            self._s21s = self._s21s[self._filled]
+            self._s22s = self._s22s[self._filled]
+            self._rows = {code: row for row, (code, _) in enumerate(self._ideal_amp)}
+            self._filled = np.ones(len(self._ideal_amp), dtype=bool)
+            self.invalidate()
+        self._memo.pop('stats', None)
+        self.ready = bool(self._filled.any())
 
-        for pars in s2p:
-            for i in range(9):
-                array = pars[i * points: i * points + points]
-                if i == 0:
-                    self._freqs = array
-                elif i == 1:
-                    self._s11s.append(array)
-                elif i == 3:
-                    self._s21s.append(array)
-                elif i == 7:
-                    self._s22s.append(array)
-        self._process()
+    @property
+    def adjust(self):
+        return self._adjust
+
+    @adjust.setter
+    def adjust(self, value):
+        if value != self._adjust:
+            self._adjust = value
+            self.invalidate()
+
+    @property
+    def only_main_states(self):
+        return self._only_main_states
+
+    @only_main_states.setter
+    def only_main_states(self, value):
+        if value != self._only_main_states:
+            self._only_main_states = value
+            if self._adjust:
+                self.invalidate()
+
+    @property
+    def measured(self):
+        # (freqs, s11, s21, s22) as measured, whether adjusting or not
+        return self._freqs, self._s11s, self._s21s, self._s22s
 
     @property
     def freqs(self):
-        return self._freqs
+        return self._source()[0]
+
+    @property
+    def s11(self):
+        return self._source()[1]
 
     @property
     def s21(self):
-        return self._s21s
+        return self._cached('s21', self._calc_s21)
+
+    @property
+    def s22(self):
+        return self._source()[3]
 
     @property
     def vswr_in(self):
-        return self._vswr_in
+        return self._cached('vswr_in', lambda: self._calc_vswr(self.s11))
 
     @property
     def vswr_out(self):
-        return self._vswr_out
+        return self._cached('vswr_out', lambda: self._calc_vswr(self.s22))
 
     @property
     def s21_err(self):
-        return self._s21s_err
+        return self._cached('s21_err', self._calc_s21_err)
+
+    @property
+    def current(self):
+        return self._current
+
+    @property
+    def amp_values(self):
+        return self._ideal_amp
+
+    @property
+    def secondary_params(self):
+        return self._secondaryParams
+
+    @property
+    def repeatability(self):
+        # per-state, per-frequency statistics over all measurement cycles,
+        # arrays of (states x [S11, S21, S22] x points) keyed by 'mean', 'std', 'min', 'max'
+        return self._repeatability
 
     @property
     def adjust_set(self):
@@ -240,30 +381,80 @@ class MeasureResult:
 
     @adjust_set.setter
     def adjust_set(self, value):
-        self._adjust_dir = self.adjust_dirs[value]
+        adjust_dir = self.adjust_dirs[value]
+        if adjust_dir != self._adjust_dir:
+            self._adjust_dir = adjust_dir
+            if self._adjust:
+                self.invalidate()
 
     @property
     def stats(self):
+        return self._cached('stats', self._format_stats)
+
+    def _format_stats(self):
         cur1, cur2 = [c * 1_000 for c in self._current]
 
         stat_freq = self._secondaryParams['Fstat']
-        stat_freq_index = _find_freq_index(self._freqs, stat_freq)
+        stat_freq_index = self._axis.index(stat_freq)
 
-        s21_response_at_zero = self._s21s[0][stat_freq_index]
+        s21s = self.s21
+        vswr_in = self.vswr_in
+        vswr_out = self.vswr_out
+        s21_response_at_zero = s21s[0][stat_freq_index]
 
-        f1 = round(self.freqs[self._min_freq_index] / 1_000_000_000, 2)
-        f2 = round(self.freqs[self._max_freq_index] / 1_000_000_000, 2)
+        min_freq_index, max_freq_index = self._cached('bandwidth', self._calc_bandwidth)
+        f1 = round(self.freqs[min_freq_index] / 1_000_000_000, 2)
+        f2 = round(self.freqs[max_freq_index] / 1_000_000_000, 2)
 
         fstat = stat_freq
-        vswr_in_at_stat_freq = round(self._vswr_in[0][stat_freq_index], 2)
-        vswr_out_at_stat_freq = round(self._vswr_out[0][stat_freq_index], 2)
+        vswr_in_at_stat_freq = round(vswr_in[0][stat_freq_index], 2)
+        vswr_out_at_stat_freq = round(vswr_out[0][stat_freq_index], 2)
 
         error = '\n'.join([
             f'{s[stat_freq_index]:.03f} при {value}'
             for (code, value), s
-            in zip(self._ideal_amp, self._s21s_err)
+            in zip(self._ideal_amp, self.s21_err)
             if code in self.main_states
         ][1:])
+
+        main = [i for i, (code, _) in enumerate(self._ideal_amp) if code in self.main_states]
+
+        band = ''
+        band_max = self._cached('band_max', self._calc_band_max)
+        if band_max is not None:
+            vswr_in_max, vswr_out_max, s21_err_max = band_max
+            band = f'''
+В полосе {self._secondaryParams['Fborder1']}–{self._secondaryParams['Fborder2']} ГГц, не более:
+КСВ вх {np.nanmax(vswr_in_max[main]):.02f}, КСВ вых {np.nanmax(vswr_out_max[main]):.02f}
+Амплитудная ошибка {np.nanmax(s21_err_max[main]):.03f} дБ
+'''
+
+        spots = ''
+        if self.spot_freqs:
+            at_spots = self.at_freqs(self.spot_freqs)
+            inside = self._axis.inside(self.spot_freqs)
+            spots = '\nНа контрольных частотах, S21 / КСВ вх / КСВ вых:\n' + '\n'.join(
+                f'{f} ГГц: {s21:.02f} / {vin:.02f} / {vout:.02f}' if ok else f'{f} ГГц: вне диапазона измерения'
+                for f, ok, s21, vin, vout
+                in zip(self.spot_freqs, inside, at_spots['s21'][0], at_spots['vswr_in'][0], at_spots['vswr_out'][0])
+            ) + '\n'
+
+        repeat = ''
+        if self._repeatability and self._repeatability['count'].max() > 1:
+            s21_std = self._repeatability['std'][:, 1, stat_freq_index]
+            s21_span = self._repeatability['max'][:, 1, stat_freq_index] - self._repeatability['min'][:, 1, stat_freq_index]
+            repeat = f'''
+Повторяемость S21 на {fstat} ГГц, {self._repeatability['count'].max()} циклов:
+СКО не более {np.nanmax(s21_std):.03f} дБ
+Размах не более {np.nanmax(s21_span):.03f} дБ
+'''
+
+        predicted = ''
+        if self.predicted:
+            predicted = f'''
+Предсказано по битовой модели: {len(self.predicted)} состояний
+Ошибка проверки S21 не более {max(self.predicted.values()):.03f} дБ
+'''
         return f'''Потребление тока при 5.25 В:
 {cur1} мА, 1 канал
 {cur2} мА, 2 канал
@@ -281,4 +472,4 @@ Fкон {f2} ГГц
 КСВ:
 {vswr_in_at_stat_freq} на {fstat} ГГц, вход
 {vswr_out_at_stat_freq} на {fstat} ГГц, выход
-'''
+{band}{spots}{repeat}{predicted}'''
@@ -1,8 +1,8 @@
-from PyQt5 import uic
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, QRunnable, QThreadPool
-from PyQt5.QtWidgets import QWidget, QComboBox, QLabel, QMessageBox, QDoubleSpinBox, QSpinBox
+from PyQt5.QtWidgets import QWidget, QComboBox, QLabel, QMessageBox, QDoubleSpinBox, QSpinBox, QPushButton, QProgressBar
 
 from deviceselectwidget import DeviceSelectWidget
+from uiloader import load_ui
 
 
 class MeasureTask(QRunnable):
@@ -15,8 +15,11 @@ class MeasureTask(QRunnable):
         self.kwargs = kwargs
 
     def run(self):
-        self.fn(*self.args, **self.kwargs)
-        self.end()
+        # the widget gets its buttons back even if the measurement fails
+        try:
+            self.fn(*self.args, **self.kwargs)
+        finally:
+            self.end()
 
 
 class MeasureWidget(QWidget):
@@ -29,7 +32,7 @@ class MeasureWidget(QWidget):
     def __init__(self, parent=None, controller=None):
         super().__init__(parent=parent)
 
-        self._ui = uic.loadUi('measurewidget.ui', self)
+        self._ui = load_ui('measurewidget', self)
         self._controller = controller
         self._threads = QThreadPool()
 
@@ -39,6 +42,18 @@ class MeasureWidget(QWidget):
 
         self._selectedDevice = self._devices.selected
 
+        self._btnCancel = QPushButton('Отмена', parent=self)
+        self._btnCancel.setEnabled(False)
+        self._btnCancel.clicked.connect(self.on_btnCancel_clicked)
+        self._ui.horizontalLayout.addWidget(self._btnCancel)
+
+        self._progress = QProgressBar(parent=self)
+        self._progress.setTextVisible(True)
+        self._progress.setFormat('')
+        self._ui.layParams.addWidget(self._progress)
+
+        self._controller.measureProgress.connect(self.on_measureProgress)
+
     def check(self):
         print('checking...')
         self._modeDuringCheck()
@@ -69,6 +84,7 @@ class MeasureWidget(QWidget):
         print('measure complete')
         if not self._controller.hasResult:
             print('error during measurement')
+            self._modePreCheck()
             return
 
         self._modePreCheck()
@@ -89,32 +105,53 @@ class MeasureWidget(QWidget):
         self.measureStarted.emit()
         self.measure()
 
+    @pyqtSlot()
+    def on_btnCancel_clicked(self):
+        print('cancel measure')
+        self._btnCancel.setEnabled(False)
+        self._controller.cancel()
+
+    @pyqtSlot(dict)
+    def on_measureProgress(self, progress):
+        self._progress.setMaximum(progress['total'])
+        self._progress.setValue(progress['done'])
+        minutes, seconds = divmod(int(progress['eta']), 60)
+        self._progress.setFormat(f'цикл {progress["cycle"] + 1}/{progress["cycles"]}, '
+                                 f'{progress["state_time"]:.2f} с/сост., осталось {minutes}:{seconds:02d}')
+
     @pyqtSlot(str)
     def on_selectedChanged(self, value):
         self._selectedDevice = value
         self.selectedChanged.emit(value)
 
     def _modePreConnect(self):
+        self._btnCancel.setEnabled(False)
         self._ui.btnCheck.setEnabled(False)
         self._ui.btnMeasure.setEnabled(False)
         self._devices.enabled = True
 
     def _modePreCheck(self):
+        self._btnCancel.setEnabled(False)
         self._ui.btnCheck.setEnabled(True)
         self._ui.btnMeasure.setEnabled(False)
         self._devices.enabled = True
 
     def _modeDuringCheck(self):
+        self._btnCancel.setEnabled(False)
         self._ui.btnCheck.setEnabled(False)
         self._ui.btnMeasure.setEnabled(False)
         self._devices.enabled = False
 
     def _modePreMeasure(self):
+        self._btnCancel.setEnabled(False)
         self._ui.btnCheck.setEnabled(False)
         self._ui.btnMeasure.setEnabled(True)
         self._devices.enabled = False
 
     def _modeDuringMeasure(self):
+        self._btnCancel.setEnabled(True)
+        self._progress.setValue(0)
+        self._progress.setFormat('')
         self._ui.btnCheck.setEnabled(False)
         self._ui.btnMeasure.setEnabled(False)
         self._devices.enabled = False
@@ -1,7 +1,7 @@
-import itertools
+import numpy as np
 
+from PyQt5.QtCore import QTimer, pyqtSlot
 from PyQt5.QtWidgets import QGridLayout, QWidget
-from mytools.plotwidget import PlotWidget
 
 
 class PrimaryPlotWidget(QWidget):
@@ -30,24 +30,51 @@ class PrimaryPlotWidget(QWidget):
         },
     }
 
+    max_redraw_rate = 10
+
     def __init__(self, parent=None, result=None):
         super().__init__(parent)
 
         self._result = result
-        self.only_main_states = False
+        self._only_main_states = False
+        self._highlighted = None
+        self._codes = list()
 
         self._grid = QGridLayout()
 
-        self._plotS21 = PlotWidget(parent=None, toolbar=True)
-        self._plotVswrIn = PlotWidget(parent=None, toolbar=True)
-        self._plotVswrOut = PlotWidget(parent=None, toolbar=True)
+        # matplotlib is imported and the plots are built on first use, see _ensure_plots
+        self._plotS21 = None
+        self._plotVswrIn = None
+        self._plotVswrOut = None
+
+        # states measured since the last redraw, keyed by code
+        self._pending = dict()
+        self._redrawTimer = QTimer(self)
+        self._redrawTimer.setInterval(1000 // self.max_redraw_rate)
+        self._redrawTimer.timeout.connect(self._redraw_pending)
+
+        self.setLayout(self._grid)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # build the plots right after the window has been painted
+        if self._plotS21 is None:
+            QTimer.singleShot(0, self._ensure_plots)
+
+    def _ensure_plots(self):
+        if self._plotS21 is not None:
+            return
+
+        from liveplotwidget import LivePlotWidget
+
+        self._plotS21 = LivePlotWidget(parent=None, toolbar=True)
+        self._plotVswrIn = LivePlotWidget(parent=None, toolbar=True)
+        self._plotVswrOut = LivePlotWidget(parent=None, toolbar=True)
 
         self._grid.addWidget(self._plotS21, 0, 0)
         self._grid.addWidget(self._plotVswrIn, 0, 1)
         self._grid.addWidget(self._plotVswrOut, 1, 1)
 
-        self.setLayout(self._grid)
-
         self._init()
 
     def _init(self, dev_id=0):
@@ -68,30 +95,96 @@ class PrimaryPlotWidget(QWidget):
         setup_plot(self._plotVswrOut, self.params[dev_id]['11'])
 
     def clear(self):
+        self._ensure_plots()
+        self._pending.clear()
+        self._redrawTimer.stop()
+        self._codes = list()
         self._plotS21.clear()
         self._plotVswrIn.clear()
         self._plotVswrOut.clear()
+        self._init()
+
+    @pyqtSlot(object)
+    def on_stateMeasured(self, state):
+        if self._only_main_states and state['code'] not in self.main_states:
+            return
+        self._pending[state['code']] = state
+        if not self._redrawTimer.isActive():
+            self._redrawTimer.start()
+
+    def _redraw_pending(self):
+        if not self._pending:
+            self._redrawTimer.stop()
+            return
+        self._ensure_plots()
+
+        for code, state in self._pending.items():
+            self._plotS21.update_line(code, state['freqs'], state['s21'])
+            self._plotVswrIn.update_line(code, state['freqs'], state['vswr_in'])
+            self._plotVswrOut.update_line(code, state['freqs'], state['vswr_out'])
+        self._pending.clear()
+
+        self._plotS21.blit()
+        self._plotVswrIn.blit()
+        self._plotVswrOut.blit()
 
     def plot(self, dev_id=0):
         print('plotting primary stats')
-        self.clear()
-        self._init(dev_id)
-
-        for_states = self.main_states if self.only_main_states else range(64)
-        # for_states = range(len(self.main_states))
+        self._ensure_plots()
+        self._pending.clear()
+        self._redrawTimer.stop()
 
         freqs = self._result.freqs
-        s21s = self._result.s21[:1]
-        vswr_in = self._result.vswr_in[:1]
-        vswr_out = self._result.vswr_out[:1]
-
-        n = len(s21s)
-
-        for xs, ys in zip(itertools.repeat(freqs, n), s21s):
-            self._plotS21.plot(xs, ys)
-
-        for xs, ys in zip(itertools.repeat(freqs, n), vswr_in):
-            self._plotVswrIn.plot(xs, ys)
-
-        for xs, ys in zip(itertools.repeat(freqs, n), vswr_out):
-            self._plotVswrOut.plot(xs, ys)
+        self._codes = [code for code, _ in self._result.amp_values]
+
+        for plot, values in [(self._plotS21, self._result.s21),
+                             (self._plotVswrIn, self._result.vswr_in),
+                             (self._plotVswrOut, self._result.vswr_out)]:
+            plot.drop_lines()
+            # states x points x (f, value)
+            segments = np.stack([np.broadcast_to(freqs, np.shape(values)), values], axis=-1)
+            plot.set_segments('states', segments)
+
+        self._update_styles()
+
+    def _update_styles(self):
+        # main/all states and highlighting only restyle the existing collections
+        if not self._codes:
+            return
+
+        from matplotlib import rcParams
+        from matplotlib.colors import to_rgba_array
+
+        cycle = rcParams['axes.prop_cycle'].by_key()['color']
+        colors = to_rgba_array([cycle[i % len(cycle)] for i in range(len(self._codes))])
+        widths = np.full(len(self._codes), rcParams['lines.linewidth'])
+
+        if self._highlighted in self._codes:
+            colors[:, 3] = 0.25
+            index = self._codes.index(self._highlighted)
+            colors[index, 3] = 1.0
+            widths[index] *= 2
+
+        if self._only_main_states:
+            colors[[code not in self.main_states for code in self._codes], 3] = 0.0
+
+        for plot in [self._plotS21, self._plotVswrIn, self._plotVswrOut]:
+            collection = plot.collection('states')
+            if collection is None:
+                continue
+            collection.set_colors(colors)
+            collection.set_linewidths(widths)
+            plot.redraw()
+
+    def highlight(self, code=None):
+        self._highlighted = code
+        self._update_styles()
+
+    @property
+    def only_main_states(self):
+        return self._only_main_states
+
+    @only_main_states.setter
+    def only_main_states(self, value):
+        self._only_main_states = value
+        self._update_styles()
@@ -0,0 +1,156 @@
+import datetime
+import json
+import os
+import zlib
+
+import numpy as np
+
+
+def record_from_result(result, serial=''):
+    # the measured traces, not the adjust set the metrics are shown for when adjusting
+    freqs, s11, s21, s22 = result.measured
+    return {
+        'serial': serial,
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'amp_values': [[int(code), float(amp)] for code, amp in result.amp_values],
+        'current': [float(c) for c in result.current],
+        'secondary': result.secondary_params,
+        # [code, verification error] of states predicted by the bit model instead of measured
+        'predicted': [[int(code), float(error)] for code, error in sorted(result.predicted.items())],
+        'freqs': freqs,
+        's11': s11,
+        's21': s21,
+        's22': s22,
+    }
+
+
+class ResultArchive:
+    # one record per DUT run, appended to fixed-shape chunk files of `chunk_size` runs:
+    #
+    #   <path>/index.jsonl                 run metadata, one json line per run
+    #   <path>/<series>/codes.npy          state codes of the series
+    #   <path>/<series>/<field>_NNNNN.npy  (chunk_size x ...) arrays, opened memory-mapped
+    #
+    # a series groups runs with the same state codes and number of points,
+    # so any field can be sliced across runs without loading whole chunks
+
+    chunk_size = 256
+
+    fields = {
+        'freqs': np.float64,
+        'current': np.float64,
+        's11': np.float32,
+        's21': np.float32,
+        's22': np.float32,
+    }
+
+    def __init__(self, path='archive'):
+        self._path = path
+        self._index_path = os.path.join(path, 'index.jsonl')
+        self._runs = list()
+        self._counts = dict()
+
+        self._load_index()
+
+    def __len__(self):
+        return len(self._runs)
+
+    def _load_index(self):
+        if not os.path.isfile(self._index_path):
+            return
+        with open(self._index_path, mode='rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    self._add_run(json.loads(line))
+
+    def _add_run(self, run):
+        self._runs.append(run)
+        self._counts[run['series']] = max(self._counts.get(run['series'], 0), run['slot'] + 1)
+
+    def _chunk_path(self, series, field, chunk):
+        return os.path.join(self._path, series, f'{field}_{chunk:05d}.npy')
+
+    def _open_chunk(self, series, field, chunk, shape):
+        path = self._chunk_path(series, field, chunk)
+        if os.path.isfile(path):
+            return np.load(path, mmap_mode='r+')
+        return np.lib.format.open_memmap(path, mode='w+', dtype=self.fields[field], shape=(self.chunk_size, ) + shape)
+
+    def append(self, result, serial=''):
+        return self.append_record(record_from_result(result, serial))
+
+    def append_record(self, record):
+        codes = np.array([code for code, _ in record['amp_values']], dtype=np.int64)
+        freqs = np.asarray(record['freqs'], dtype=np.float64)
+        series = f'{len(codes)}x{len(freqs)}_{zlib.crc32(codes.tobytes()):08x}'
+
+        series_dir = os.path.join(self._path, series)
+        if not os.path.isdir(series_dir):
+            os.makedirs(series_dir)
+            np.save(os.path.join(series_dir, 'codes.npy'), codes)
+
+        slot = self._counts.get(series, 0)
+        chunk, row = divmod(slot, self.chunk_size)
+
+        for field in self.fields:
+            values = np.asarray(record[field], dtype=self.fields[field])
+            data = self._open_chunk(series, field, chunk, values.shape)
+            data[row] = values
+            data.flush()
+            del data
+
+        run = {
+            'run': len(self._runs),
+            'series': series,
+            'slot': slot,
+            'serial': record['serial'],
+            'time': record['time'],
+            'amp_values': record['amp_values'],
+            'current': record['current'],
+            'secondary': record['secondary'],
+            'predicted': record.get('predicted', list()),
+        }
+        with open(self._index_path, mode='at', encoding='utf-8') as f:
+            f.write(json.dumps(run, ensure_ascii=False) + '\n')
+        self._add_run(run)
+
+        print(f'archived run {run["run"]} to {series}/{slot}')
+        return run['run']
+
+    def runs(self, series=None):
+        if series is None:
+            return list(self._runs)
+        return [r for r in self._runs if r['series'] == series]
+
+    def codes(self, series):
+        return np.load(os.path.join(self._path, series, 'codes.npy'))
+
+    def read(self, field, state=None, last=None, series=None):
+        # e.g. read('s21', state=63, last=500) -> (runs x points) S21 of state 63 for the last 500 runs
+        if not self._runs:
+            return np.empty(0, dtype=self.fields[field])
+        if series is None:
+            series = self._runs[-1]['series']
+
+        count = self._counts[series]
+        start = 0 if last is None else max(0, count - last)
+
+        index = slice(None)
+        if state is not None:
+            codes = self.codes(series)
+            found = np.flatnonzero(codes == state)
+            if not len(found):
+                raise KeyError(f'state {state} is not in series {series}')
+            index = int(found[0])
+
+        parts = list()
+        for chunk in range(start // self.chunk_size, (count - 1) // self.chunk_size + 1):
+            lo = max(start - chunk * self.chunk_size, 0)
+            hi = min(count - chunk * self.chunk_size, self.chunk_size)
+            data = np.load(self._chunk_path(series, field, chunk), mmap_mode='r')
+            if field in ('freqs', 'current'):
+                parts.append(np.array(data[lo:hi]))
+            else:
+                parts.append(np.array(data[lo:hi, index]))
+            del data
+        return np.concatenate(parts)
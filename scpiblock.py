@@ -0,0 +1,56 @@
+import numpy as np
+
+data_formats = {
+    'ASCII': None,
+    'REAL,32': 'f4',
+    'REAL,64': 'f8',
+}
+
+byte_orders = {
+    'NORM': '>',
+    'SWAP': '<',
+}
+
+
+def block_dtype(fmt, byte_order):
+    return np.dtype(byte_orders[byte_order] + data_formats[fmt])
+
+
+def parse_block(raw, fmt='REAL,64', byte_order='SWAP'):
+    # IEEE 488.2 definite length block: #<n><length, n digits><payload>[\n]
+    # the returned array is a view over `raw`, nothing is copied
+    dtype = block_dtype(fmt, byte_order)
+    buf = memoryview(raw)
+
+    start = bytes(buf[:1])
+    if start != b'#':
+        raise ValueError(f'not a binary block, starts with {start!r}')
+
+    digits = int(bytes(buf[1:2]))
+    if digits == 0:
+        # indefinite length block, payload runs up to the terminator
+        offset = 2
+        length = len(buf) - offset
+        if length and bytes(buf[-1:]) == b'\n':
+            length -= 1
+    else:
+        offset = 2 + digits
+        length = int(bytes(buf[2:offset]))
+        if offset + length > len(buf):
+            raise ValueError(f'truncated block: expected {length} bytes, got {len(buf) - offset}')
+
+    if length % dtype.itemsize:
+        raise ValueError(f'block length {length} is not a multiple of {dtype.itemsize}')
+
+    return np.frombuffer(raw, dtype=dtype, count=length // dtype.itemsize, offset=offset)
+
+
+def make_block(values, fmt='REAL,64', byte_order='SWAP'):
+    payload = np.asarray(values, dtype=block_dtype(fmt, byte_order)).tobytes()
+    length = str(len(payload))
+    return b'#' + str(len(length)).encode('ascii') + length.encode('ascii') + payload + b'\n'
+
+
+def parse_ascii(text):
+    # comma separated FORM:DATA ASCII response, converted by numpy in one call instead of float() per value
+    return np.array(text.split(','), dtype=float)
@@ -0,0 +1,187 @@
+import collections
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from instrproxy import InstanceFactory, InstrumentProxy
+
+# recording file: numpy .npz without pickled objects, so loading one cannot run code,
+#   meta                 utf-8 json {'version': 2, 'instruments': [{'name', 'addr', 'status'}]}
+#   calls_<i>            utf-8 json [[method, args, text result or null, binary result index or -1]]
+#   times_<i>            (calls x [start, duration]) float64, s
+#   blob_<i>, offsets_<i>  binary results (query_raw blocks) concatenated, and their offsets
+record_version = 2
+
+
+class RecordedInstrument(InstrumentProxy):
+    # appends every call with its response and timing to `recorder`
+
+    def __init__(self, name, instrument, recorder):
+        super().__init__(name, instrument)
+        self._recorder = recorder
+
+    def _call(self, method, func, args, kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self._recorder.add(self._name, method, args, result, start, time.perf_counter())
+        return result
+
+
+def _text(value):
+    return np.frombuffer(json.dumps(value, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+
+def _from_text(array):
+    return json.loads(array.tobytes().decode('utf-8'))
+
+
+class ScpiRecorder:
+
+    def __init__(self):
+        self._instruments = dict()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def __len__(self):
+        return sum(len(i['calls']) for i in self._instruments.values())
+
+    def wrap(self, name, instrument):
+        if instrument is None or isinstance(instrument, RecordedInstrument):
+            return instrument
+        with self._lock:
+            self._instruments.setdefault(name, {'calls': list()}).update({
+                'addr': getattr(instrument, 'addr', ''),
+                'status': str(getattr(instrument, 'status', '')),
+            })
+        return RecordedInstrument(name, instrument, self)
+
+    def clear(self):
+        with self._lock:
+            for instrument in self._instruments.values():
+                instrument['calls'].clear()
+            self._origin = time.perf_counter()
+
+    def add(self, name, method, args, result, start, end):
+        if isinstance(result, (bytearray, memoryview)):
+            result = bytes(result)
+        with self._lock:
+            self._instruments[name]['calls'].append((method, tuple(args), result, start - self._origin, end - start))
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with self._lock:
+            arrays = _encode(self._instruments)
+        with open(path, mode='wb') as f:
+            np.savez_compressed(f, **arrays)
+        print(f'scpi recording written to {path}: {len(self)} instrument calls')
+
+
+def _encode(instruments):
+    meta = {'version': record_version, 'instruments': list()}
+    arrays = dict()
+    for i, (name, rec) in enumerate(instruments.items()):
+        meta['instruments'].append({'name': name, 'addr': rec['addr'], 'status': rec['status']})
+        calls = list()
+        blobs = list()
+        for method, args, result, _, _ in rec['calls']:
+            if isinstance(result, bytes):
+                calls.append([method, list(args), None, len(blobs)])
+                blobs.append(result)
+            else:
+                calls.append([method, list(args), result, -1])
+        arrays[f'calls_{i}'] = _text(calls)
+        arrays[f'times_{i}'] = np.array([(start, duration) for *_, start, duration in rec['calls']],
+                                        dtype=np.float64).reshape(-1, 2)
+        arrays[f'blob_{i}'] = np.frombuffer(b''.join(blobs), dtype=np.uint8)
+        arrays[f'offsets_{i}'] = np.cumsum([0] + [len(b) for b in blobs], dtype=np.int64)
+    arrays['meta'] = _text(meta)
+    return arrays
+
+
+def load_recording(path):
+    # name -> {'addr', 'status', 'calls': [(method, args, result, start, duration)]}
+    with np.load(path, allow_pickle=False) as data:
+        meta = _from_text(data['meta'])
+        if meta.get('version') != record_version:
+            raise ValueError(f'unsupported recording version {meta.get("version")} in {path}')
+
+        instruments = dict()
+        for i, rec in enumerate(meta['instruments']):
+            blob = data[f'blob_{i}'].tobytes()
+            offsets = data[f'offsets_{i}']
+            calls = list()
+            for (method, args, text, index), (start, duration) in zip(_from_text(data[f'calls_{i}']),
+                                                                      data[f'times_{i}'].tolist()):
+                result = text if index < 0 else blob[offsets[index]:offsets[index + 1]]
+                calls.append((method, tuple(args), result, start, duration))
+            instruments[rec['name']] = {'addr': rec['addr'], 'status': rec['status'], 'calls': calls}
+    return instruments
+
+
+class ReplayInstrument:
+    # serves recorded responses from memory: every (method, args) pair replays its responses in recorded order,
+    # starting over once they run out, so one recorded run can be replayed any number of times;
+    # with `timing` every call takes as long as it did on the bench, multiplied by `time_scale`
+
+    def __init__(self, addr, status, calls, timing=False, time_scale=1.0):
+        self.addr = addr
+        self.status = status
+        self.timing = timing
+        self.time_scale = time_scale
+
+        self._responses = collections.defaultdict(list)
+        for method, args, result, _, duration in calls:
+            self._responses[(method, args)].append((result, duration))
+        self._cursors = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _replay(self, method, args):
+        key = (method, args)
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                if method.startswith('query'):
+                    raise LookupError(f'{self.addr}: no recorded response to {method} {" ".join(map(str, args))}')
+                return None
+            result, duration = responses[self._cursors[key] % len(responses)]
+            self._cursors[key] += 1
+        if self.timing and duration > 0:
+            time.sleep(duration * self.time_scale)
+        return result
+
+    def rewind(self):
+        with self._lock:
+            self._cursors.clear()
+
+    def send(self, command):
+        return self._replay('send', (command,))
+
+    def query(self, question):
+        return self._replay('query', (question,))
+
+    def query_raw(self, question):
+        return self._replay('query_raw', (question,))
+
+    def set_lpf_code(self, code):
+        return self._replay('set_lpf_code', (code,))
+
+
+class ReplayFactory(InstanceFactory):
+    # every connect replays the recording from its start
+
+    def find(self):
+        self._instrument.rewind()
+        return super().find()
+
+
+def make_replay_bench(path, timing=False, time_scale=1.0):
+    return {
+        name: ReplayFactory(ReplayInstrument(rec['addr'], f'replay {rec["status"]}', rec['calls'],
+                                             timing=timing, time_scale=time_scale))
+        for name, rec in load_recording(path).items()
+    }
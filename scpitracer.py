@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from instrproxy import InstrumentProxy
+
+# histogram bucket edges for command durations, seconds
+duration_bins = [0, 0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1, 3, 10, float('inf')]
+
+
+def command_key(method, args):
+    # SCPI header without arguments, so calls aggregate per command: 'SENS1:FREQ:STAR 4GHz' -> 'SENS1:FREQ:STAR'
+    if method == 'set_lpf_code' or not args:
+        return method
+    header = str(args[0]).split(maxsplit=1) or [method]
+    return header[0].upper()
+
+
+def _size(value):
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    return len(str(value).encode('utf-8', errors='replace'))
+
+
+class TracedInstrument(InstrumentProxy):
+    # reports every traced call to `tracer`
+
+    def __init__(self, name, instrument, tracer):
+        super().__init__(name, instrument)
+        self._tracer = tracer
+
+    def _call(self, method, func, args, kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as ex:
+            self._tracer.add(self._name, method, args, start, time.perf_counter(), None, error=ex)
+            raise
+        self._tracer.add(self._name, method, args, start, time.perf_counter(), result)
+        return result
+
+
+class ScpiTracer:
+
+    def __init__(self):
+        self._events = list()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._spans = list()
+
+    def __len__(self):
+        return len(self._events)
+
+    def wrap(self, name, instrument):
+        if instrument is None or isinstance(instrument, TracedInstrument):
+            return instrument
+        return TracedInstrument(name, instrument, self)
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._spans.clear()
+            self._origin = time.perf_counter()
+
+    def add(self, instrument, method, args, start, end, result, error=None):
+        event = {
+            'instrument': instrument,
+            'method': method,
+            'command': ' '.join(str(a) for a in args),
+            'key': command_key(method, args),
+            'sent': sum(_size(a) for a in args),
+            'received': _size(result) if method.startswith('query') else 0,
+            'start': start - self._origin,
+            'duration': end - start,
+            'thread': threading.get_ident(),
+        }
+        if error is not None:
+            event['error'] = str(error)
+        with self._lock:
+            self._events.append(event)
+
+    def span(self, name, start, end):
+        # non-instrument work (parsing, processing) shown on the same timeline
+        with self._lock:
+            self._spans.append({'name': name, 'start': start - self._origin, 'duration': end - start,
+                                'thread': threading.get_ident()})
+
+    def histograms(self):
+        with self._lock:
+            events = list(self._events)
+
+        grouped = dict()
+        for e in events:
+            grouped.setdefault((e['instrument'], e['key']), list()).append(e)
+
+        stats = dict()
+        for (instrument, key), items in grouped.items():
+            durations = np.array([e['duration'] for e in items])
+            stats[f'{instrument} {key}'] = {
+                'count': len(items),
+                'total': float(durations.sum()),
+                'mean': float(durations.mean()),
+                'max': float(durations.max()),
+                'p50': float(np.percentile(durations, 50)),
+                'p95': float(np.percentile(durations, 95)),
+                'bytes': sum(e['sent'] + e['received'] for e in items),
+                'histogram': np.histogram(durations, bins=duration_bins)[0].tolist(),
+            }
+        return dict(sorted(stats.items(), key=lambda kv: kv[1]['total'], reverse=True))
+
+    def report(self):
+        lines = [f'{"command":<40} {"count":>6} {"total, s":>9} {"mean, ms":>9} {"p95, ms":>9} {"bytes":>10}']
+        for key, s in self.histograms().items():
+            lines.append(f'{key:<40} {s["count"]:>6} {s["total"]:>9.3f} {s["mean"] * 1000:>9.2f} '
+                         f'{s["p95"] * 1000:>9.2f} {s["bytes"]:>10}')
+        return '\n'.join(lines)
+
+    def export_chrome_trace(self, path):
+        # Chrome trace / Perfetto json: one track per instrument, complete ('X') events in microseconds
+        with self._lock:
+            events = list(self._events)
+            spans = list(self._spans)
+
+        tracks = {name: i + 1 for i, name in enumerate(sorted({e['instrument'] for e in events}))}
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+                 for name, tid in tracks.items()]
+        trace.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 0, 'args': {'name': 'processing'}})
+
+        for e in events:
+            args = {'command': e['command'], 'sent': e['sent'], 'received': e['received']}
+            if 'error' in e:
+                args['error'] = e['error']
+            trace.append({
+                'name': e['key'],
+                'cat': e['method'],
+                'ph': 'X',
+                'pid': 1,
+                'tid': tracks[e['instrument']],
+                'ts': e['start'] * 1_000_000,
+                'dur': e['duration'] * 1_000_000,
+                'args': args,
+            })
+        for s in spans:
+            trace.append({'name': s['name'], 'cat': 'processing', 'ph': 'X', 'pid': 1, 'tid': 0,
+                          'ts': s['start'] * 1_000_000, 'dur': s['duration'] * 1_000_000})
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, mode='wt', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        print(f'trace written to {path}: {len(events)} instrument calls')
@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+
+
+def _pieces(f1, f2, windows, sparse_step):
+    # f1..f2 split at every window edge, each piece takes the finest step of the windows covering it,
+    # `windows` are (start, stop, step), pieces outside of all windows get `sparse_step`
+    edges = sorted({f1, f2} | {edge for start, stop, _ in windows for edge in (start, stop)})
+    pieces = list()
+    for start, stop in zip(edges, edges[1:]):
+        step = min([s for a, b, s in windows if a <= start and stop <= b], default=sparse_step)
+        if pieces and pieces[-1][2] == step:
+            pieces[-1][1] = stop
+        else:
+            pieces.append([start, stop, step])
+    return pieces
+
+
+def _segments(pieces):
+    # adjacent segments share no frequency: every segment but the first starts one spacing after its edge
+    segments = list()
+    for start, stop, step in pieces:
+        intervals = max(1, int(math.ceil(round((stop - start) / step, 9))))
+        spacing = (stop - start) / intervals
+        if segments:
+            segments.append((start + spacing, stop, intervals))
+        else:
+            segments.append((start, stop, intervals + 1))
+    return segments
+
+
+def _finest(build, low, high, max_points, iterations=50):
+    # smallest step parameter in low..high whose segments fit into `max_points`
+    if segment_points(build(low)) <= max_points:
+        return build(low)
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        if segment_points(build(middle)) <= max_points:
+            high = middle
+        else:
+            low = middle
+    return build(high)
+
+
+def build_segments(f1, f2, band, spots, max_points, sparse_step=0.1, spot_points=11, spot_span=0.05):
+    # (start, stop, points) segments covering f1..f2 GHz with at most `max_points` points,
+    # unless there are more spot windows than the budget can give one point each:
+    # `spot_points` over `spot_span` around every spot frequency, `sparse_step` outside the band,
+    # the `band` gets as dense as the rest of the budget allows
+    if f2 <= f1:
+        return [(f1, f1, 1)]
+
+    band = (max(band[0], f1), min(band[1], f2))
+    spot_windows = [(max(f - spot_span / 2, f1), min(f + spot_span / 2, f2)) for f in spots if f1 <= f <= f2]
+    spot_step = spot_span / max(spot_points - 1, 1)
+
+    def build(band_step, scale=1.0):
+        windows = [(start, stop, spot_step * scale) for start, stop in spot_windows if stop > start]
+        if band[1] > band[0]:
+            windows.append((band[0], band[1], band_step))
+        return _segments(_pieces(f1, f2, windows, sparse_step * scale))
+
+    if segment_points(build(sparse_step)) <= max_points:
+        return _finest(build, (f2 - f1) / max(max_points, 2) / 4, sparse_step, max_points)
+
+    # the budget is too small even for the sparse step, everything gets coarser together
+    return _finest(lambda scale: build(sparse_step * scale, scale), 1.0, (f2 - f1) / sparse_step, max_points)
+
+
+def segment_freqs(segments):
+    # frequency axis in Hz the analyzer returns for `segments`
+    return np.concatenate([np.linspace(start, stop, points) for start, stop, points in segments]) * 1_000_000_000
+
+
+def segment_points(segments):
+    return sum(points for _, _, points in segments)
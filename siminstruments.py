@@ -0,0 +1,197 @@
+import re
+import time
+
+import numpy as np
+
+from instrproxy import InstanceFactory
+from scpiblock import make_block
+from segmentsweep import segment_freqs
+
+
+class SimInstrument:
+    # base for latency-configurable stand-ins of the bench instruments,
+    # every delay is multiplied by `time_scale`, 0 disables delays altogether
+
+    def __init__(self, addr='sim', latency=0.0005, time_scale=1.0):
+        self.addr = addr
+        self.latency = latency
+        self.time_scale = time_scale
+        self.status = f'sim {addr}'
+
+    def _wait(self, seconds):
+        if self.time_scale and seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def send(self, command):
+        self._wait(self.latency)
+        self._handle(command.strip())
+
+    def query(self, question):
+        self._wait(self.latency)
+        return self._answer(question.strip())
+
+    def _handle(self, command):
+        pass
+
+    def _answer(self, question):
+        if question == '*OPC?':
+            return '1'
+        return '0'
+
+
+class SimAnalyzer(SimInstrument):
+    # network analyzer with a synthetic attenuator response, sweep and transfer times scale with points
+
+    def __init__(self, addr='sim', latency=0.0005, time_scale=1.0, point_time=20e-6, transfer_rate=1_000_000,
+                 programmer=None):
+        super().__init__(addr=addr, latency=latency, time_scale=time_scale)
+        self.point_time = point_time
+        self.transfer_rate = transfer_rate
+        self.programmer = programmer
+
+        self.points = 201
+        self.start = 10e6
+        self.stop = 6e9
+        self.format = 'ASCII'
+        self.byte_order = 'NORM'
+        self.sweep_type = 'LIN'
+        self.segments = dict()
+        self.measurements = dict()
+        self.selected = '"CH1_S21"'
+        self._sweep_pending = False
+
+    def _handle(self, command):
+        header, _, value = command.partition(' ')
+        header = header.upper()
+        if header == 'SYST:PRES':
+            self.points, self.start, self.stop, self.format = 201, 10e6, 6e9, 'ASCII'
+            self.sweep_type = 'LIN'
+            self.segments.clear()
+        elif header == 'SENS1:SWE:POIN':
+            self.points = int(value)
+        elif header == 'SENS1:FREQ:STAR':
+            self.start = _parse_freq(value)
+        elif header == 'SENS1:FREQ:STOP':
+            self.stop = _parse_freq(value)
+        elif header == 'FORM:DATA':
+            self.format = value.strip().upper()
+        elif header == 'FORM:BORD':
+            self.byte_order = value.strip().upper()
+        elif header == 'SENS1:SWE:MODE' and value.strip().upper().startswith('SING'):
+            self._sweep_pending = True
+        elif header == 'CALC1:PAR:DEF':
+            name, _, param = value.partition(',')
+            self.measurements[name.strip()] = param.strip().upper()
+        elif header == 'CALC1:PAR:SEL':
+            self.selected = value.strip()
+        elif header == 'SENS1:SWE:TYPE':
+            self.sweep_type = value.strip().upper()[:3]
+        elif header == 'SENS1:SEGM:DEL:ALL':
+            self.segments.clear()
+        elif header.startswith('SENS1:SEGM'):
+            self._handle_segment(header, value)
+
+    def _handle_segment(self, header, value):
+        match = re.match(r'SENS1:SEGM(\d+)(:.*)?$', header)
+        if not match:
+            return
+        segment = self.segments.setdefault(int(match.group(1)), [self.start / 1e9, self.stop / 1e9, 2])
+        setting = match.group(2)
+        if setting == ':FREQ:STAR':
+            segment[0] = _parse_freq(value) / 1e9
+        elif setting == ':FREQ:STOP':
+            segment[1] = _parse_freq(value) / 1e9
+        elif setting == ':SWE:POIN':
+            segment[2] = int(value)
+
+    def freqs(self):
+        if self.sweep_type == 'SEG' and self.segments:
+            return segment_freqs([self.segments[i] for i in sorted(self.segments)])
+        return np.linspace(self.start, self.stop, self.points)
+
+    def _answer(self, question):
+        if question == '*OPC?' and self._sweep_pending:
+            self._sweep_pending = False
+            self._wait(len(self.freqs()) * self.point_time)
+        data = self._data(question)
+        if data is not None:
+            if self.format == 'ASCII':
+                text = ','.join(f'{v:.6e}' for v in data)
+                self._wait(len(text) / self.transfer_rate)
+                return text
+        return super()._answer(question)
+
+    def _data(self, question):
+        question = question.upper()
+        if question.startswith('CALC1:DATA:SNP?'):
+            return self.snp()
+        if question.startswith('SENS1:X?'):
+            return self.freqs()
+        if question.startswith('CALC1:DATA? FDATA'):
+            row = {'S11': 1, 'S21': 3, 'S12': 5, 'S22': 7}[self.measurements.get(self.selected, 'S21')]
+            return np.reshape(self.snp(), (9, -1))[row]
+        return None
+
+    def query_raw(self, question):
+        self._wait(self.latency)
+        block = make_block(self._data(question), self.format, self.byte_order)
+        self._wait(len(block) / self.transfer_rate)
+        return block
+
+    def snp(self, code=None):
+        if code is None:
+            code = self.programmer.code if self.programmer is not None else 0
+        freqs = self.freqs()
+        slope = freqs / max(freqs[-1], 1.0)
+
+        s11 = -20 + 3 * slope
+        s21 = -1.5 - code * 0.25 - 1.2 * slope
+        s22 = -18 + 2 * slope
+        phase = -180 * slope
+        return np.concatenate([freqs, s11, phase, s21, phase, s21, phase, s22, phase])
+
+
+class SimSource(SimInstrument):
+
+    def __init__(self, addr='sim', latency=0.0005, time_scale=1.0, currents=(0.0035, 0.0045)):
+        super().__init__(addr=addr, latency=latency, time_scale=time_scale)
+        self.currents = currents
+        self._output = 0
+
+    def _handle(self, command):
+        if command.lower().startswith('inst:sel outp'):
+            self._output = int(command[-1]) - 1
+
+    def _answer(self, question):
+        if question.upper() == 'MEAS:CURR?':
+            return f'{self.currents[self._output]:.6f}'
+        return super()._answer(question)
+
+
+class SimProgrammer(SimInstrument):
+
+    def __init__(self, addr='sim', latency=0.002, time_scale=1.0):
+        super().__init__(addr=addr, latency=latency, time_scale=time_scale)
+        self.code = 0
+
+    def set_lpf_code(self, code):
+        self._wait(self.latency)
+        self.code = code
+
+
+def make_sim_bench(latency=0.0005, time_scale=1.0, point_time=20e-6, transfer_rate=1_000_000, switch_time=0.002):
+    prog = SimProgrammer(addr='COM-sim', latency=switch_time, time_scale=time_scale)
+    return {
+        'Анализатор': InstanceFactory(SimAnalyzer(addr='GPIB-sim::9', latency=latency, time_scale=time_scale,
+                                             point_time=point_time, transfer_rate=transfer_rate, programmer=prog)),
+        'Источник питания': InstanceFactory(SimSource(addr='GPIB-sim::5', latency=latency, time_scale=time_scale)),
+        'Программатор': InstanceFactory(prog),
+    }
+
+
+def _parse_freq(value):
+    value = value.strip().upper()
+    for suffix, mul in [('GHZ', 1e9), ('MHZ', 1e6), ('KHZ', 1e3), ('HZ', 1)]:
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * mul
+    return float(value)
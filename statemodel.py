@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class BitModel:
+    # superposition of per-bit contributions: every composite code is predicted as the zero state
+    # plus the (dB) deltas of each single-bit state whose bit is set in the code
+
+    def __init__(self, zero, deltas):
+        self._zero = zero
+        self._deltas = deltas
+
+    @classmethod
+    def fit(cls, traces, bits=6):
+        # `traces` maps code -> S21 (dB) over frequency, code 0 and every single-bit code are required
+        zero = np.asarray(traces[0], dtype=float)
+        deltas = np.stack([np.asarray(traces[1 << bit], dtype=float) - zero for bit in range(bits)])
+        return cls(zero, deltas)
+
+    @property
+    def bits(self):
+        return len(self._deltas)
+
+    def predict(self, code):
+        mask = np.array([(code >> bit) & 1 for bit in range(self.bits)], dtype=bool)
+        return self._zero + self._deltas[mask].sum(axis=0)
+
+    def error(self, code, values):
+        # max abs prediction error over frequency
+        return float(np.nanmax(np.abs(self.predict(code) - values)))
+
+
+def is_single_bit(code):
+    return code == 0 or code & (code - 1) == 0
+
+
+def sample_states(indices, fraction):
+    # evenly spread verification subset, at least one state
+    if not indices:
+        return list()
+    count = min(len(indices), max(1, int(round(len(indices) * fraction))))
+    picks = np.linspace(0, len(indices) - 1, count).round().astype(int)
+    return [indices[i] for i in sorted(set(picks))]
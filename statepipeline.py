@@ -0,0 +1,55 @@
+import queue
+import threading
+
+
+class StatePipeline:
+    # runs `process` on a worker thread and hands the result to `sink` in submission order,
+    # so the acquisition thread can switch and sweep the next state meanwhile
+
+    def __init__(self, process, sink, depth=4):
+        self._process = process
+        self._sink = sink
+        self._queue = queue.Queue(maxsize=depth)
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run, name='state-pipeline', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close(raise_error=exc_type is None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    self._sink(*self._process(*item))
+            except Exception as ex:
+                print('state pipeline error:', ex)
+                self._error = ex
+            finally:
+                self._queue.task_done()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, *item):
+        self._check()
+        self._queue.put(item)
+
+    def drain(self):
+        self._queue.join()
+        self._check()
+
+    def close(self, raise_error=True):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if raise_error:
+            self._check()
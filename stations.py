@@ -0,0 +1,184 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from batch import BatchRunner, default_secondary, read_params, read_serials
+from instrumentcontroller import InstrumentController
+from resultarchive import ResultArchive, record_from_result
+from scpirecord import make_replay_bench
+from siminstruments import make_sim_bench
+
+# stations.ini holds a list of station dicts, every station is one bench with its own queue of parts:
+#
+#   [
+#       {'name': 'bench1', 'serials': 'bench1.txt',
+#        'analyzer': 'GPIB0::9::INSTR', 'source': 'GPIB0::5::INSTR', 'programmer': 'COM5'},
+#       {'name': 'bench2', 'serials': 'bench2.txt',
+#        'analyzer': 'GPIB1::9::INSTR', 'source': 'GPIB1::5::INSTR', 'programmer': 'COM6',
+#        'device': 'Цифровой аттенюатор', 'secondary': {'Fborder1': 1, 'Fborder2': 4}, 'main_states': True},
+#   ]
+#
+# 'sim': True runs a station on simulated instruments, 'replay': path on a scpi recording
+
+instrument_keys = {
+    'analyzer': 'Анализатор',
+    'source': 'Источник питания',
+    'programmer': 'Программатор',
+}
+
+
+def read_stations(path):
+    stations = read_params(path)
+    names = [s['name'] for s in stations]
+    if len(set(names)) != len(names):
+        raise ValueError(f'station names are not unique in {path}: {names}')
+    return stations
+
+
+def _make_controller(station):
+    controller = InstrumentController()
+    controller.archive = None
+    controller.secondaryParams = dict(default_secondary)
+    controller.secondaryParams.update(station.get('secondary', dict()))
+    controller.only_main_states = station.get('main_states', False)
+    controller.result.only_main_states = controller.only_main_states
+    controller.adaptive_states = station.get('adaptive', False)
+    controller.record_dir = os.path.join(controller.record_dir, station['name'])
+    controller.trace_dir = os.path.join(controller.trace_dir, station['name'])
+
+    if station.get('sim'):
+        controller.use_offline_bench(make_sim_bench())
+    elif station.get('replay'):
+        controller.use_offline_bench(make_replay_bench(station['replay']))
+    if station.get('record'):
+        controller.enable_recording()
+
+    addrs = {k: v.addr for k, v in controller.requiredInstruments.items()}
+    for key, name in instrument_keys.items():
+        if station.get(key):
+            addrs[name] = station[key]
+    return controller, addrs
+
+
+def run_station(station, results, out_dir):
+    # worker process: one controller, one bench, results go back to the parent over `results`
+    name = station['name']
+
+    def on_result(serial, result):
+        results.put(('result', name, record_from_result(result, serial)))
+
+    try:
+        controller, addrs = _make_controller(station)
+        controller.connect(addrs)
+        if not controller.found:
+            raise RuntimeError(f'connect error, check connection: {controller}')
+
+        device = station.get('device') or next(iter(controller.deviceParams))
+        runner = BatchRunner(controller, device, out_dir=os.path.join(out_dir, name), on_result=on_result)
+        passed, failed = runner.run(read_serials(station['serials']))
+        results.put(('done', name, (len(passed), len(failed))))
+    except Exception as ex:
+        results.put(('error', name, str(ex)))
+
+
+class StationManager:
+    # one worker process per station, every result is appended to the single `archive` by the parent
+
+    def __init__(self, stations, archive=None, out_dir='results'):
+        self._stations = stations
+        self._archive = archive
+        self._out_dir = out_dir
+        # spawn: workers start without the parent's Qt and VISA state
+        self._context = multiprocessing.get_context('spawn')
+
+        self.counts = {s['name']: [0, 0] for s in stations}
+        self.errors = dict()
+
+    def run(self, poll=1.0):
+        results = self._context.Queue()
+        workers = {
+            s['name']: self._context.Process(target=run_station, args=(s, results, self._out_dir),
+                                             name=f'station {s["name"]}', daemon=True)
+            for s in self._stations
+        }
+        start = time.perf_counter()
+        for worker in workers.values():
+            worker.start()
+
+        pending = set(workers)
+        try:
+            while pending:
+                try:
+                    kind, name, payload = results.get(timeout=poll)
+                except queue.Empty:
+                    dead = [n for n in pending if not workers[n].is_alive()]
+                    if dead:
+                        # a worker may have exited right after its last messages, those are handled first
+                        self._drain(results, pending, start)
+                    for name in [n for n in dead if n in pending]:
+                        self.errors[name] = f'worker exited with code {workers[name].exitcode}'
+                        pending.discard(name)
+                    continue
+                self._handle(kind, name, payload, pending, start)
+        except KeyboardInterrupt:
+            print('stations interrupted')
+            for worker in workers.values():
+                worker.terminate()
+
+        for worker in workers.values():
+            worker.join()
+        return self._report(time.perf_counter() - start)
+
+    def _drain(self, results, pending, start):
+        while True:
+            try:
+                kind, name, payload = results.get_nowait()
+            except queue.Empty:
+                return
+            self._handle(kind, name, payload, pending, start)
+
+    def _handle(self, kind, name, payload, pending, start):
+        if kind == 'result':
+            self.counts[name][0] += 1
+            if self._archive is not None:
+                try:
+                    self._archive.append_record(payload)
+                except OSError as ex:
+                    print('error writing result archive:', ex)
+            rate = sum(c[0] for c in self.counts.values()) / (time.perf_counter() - start) * 3600
+            print(f'{name}: {payload["serial"]} stored, {rate:.1f} parts/h total')
+        elif kind == 'done':
+            self.counts[name] = list(payload)
+            pending.discard(name)
+            print(f'{name}: done, {payload[0]} ok, {payload[1]} failed')
+        elif kind == 'error':
+            self.errors[name] = payload
+            pending.discard(name)
+            print(f'{name}: error:', payload)
+
+    def _report(self, elapsed):
+        passed = sum(c[0] for c in self.counts.values())
+        failed = sum(c[1] for c in self.counts.values())
+        print(f'stations done: {passed} ok, {failed} failed, {len(self.errors)} stations with errors '
+              f'in {elapsed:.1f} s, {(passed + failed) / elapsed * 3600 if elapsed else 0.0:.1f} parts/h')
+        return passed, failed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='headless measurement on several benches in parallel')
+    parser.add_argument('stations', nargs='?', default='stations.ini', help='file with the list of stations')
+    parser.add_argument('--archive', default='archive', help='shared result archive, empty to disable')
+    parser.add_argument('--out', default='results', help='directory for the per station, per part stats')
+    args = parser.parse_args(argv)
+
+    archive = ResultArchive(args.archive) if args.archive else None
+    manager = StationManager(read_stations(args.stations), archive=archive, out_dir=args.out)
+    _, failed = manager.run()
+    return 1 if failed or manager.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
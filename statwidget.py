@@ -1,6 +1,7 @@
-from PyQt5 import uic
 from PyQt5.QtWidgets import QWidget, QPlainTextEdit
 
+from uiloader import load_ui
+
 
 class StatWidget(QWidget):
 
@@ -9,7 +10,7 @@ class StatWidget(QWidget):
 
         self._result = result
 
-        self._ui = uic.loadUi('statwidget.ui', self)
+        self._ui = load_ui('statwidget', self)
 
         self._ui.texteditStat.setPlainText('')
 
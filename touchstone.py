@@ -0,0 +1,105 @@
+import os
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+freq_units = {
+    'HZ': 1,
+    'KHZ': 1_000,
+    'MHZ': 1_000_000,
+    'GHZ': 1_000_000_000,
+}
+
+cache_name = '.adjust_cache.npz'
+
+
+def _parse_options(line, options):
+    words = line[1:].upper().split()
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if word in freq_units:
+            options['unit'] = word
+        elif word in ('S', 'Y', 'Z', 'H', 'G'):
+            options['param'] = word
+        elif word in ('DB', 'MA', 'RI'):
+            options['format'] = word
+        elif word == 'R' and i + 1 < len(words):
+            options['r'] = float(words[i + 1])
+            i += 1
+        i += 1
+
+
+def _to_db(first, second, fmt):
+    if fmt == 'DB':
+        return first
+    if fmt == 'MA':
+        return 20 * np.log10(first)
+    return 20 * np.log10(np.hypot(first, second))
+
+
+def read_touchstone(path, ports=2):
+    # returns frequencies in Hz, (params x points) magnitudes in dB in file order (S11, S21, S12, S22)
+    # and the parsed option line
+    options = {'unit': 'GHZ', 'param': 'S', 'format': 'MA', 'r': 50.0}
+
+    with open(path, mode='rt', encoding='utf-8') as f:
+        lines = f.readlines()
+
+    data_lines = list()
+    for line in lines:
+        line = line.split('!', 1)[0].strip()
+        if not line or line.startswith('['):
+            continue
+        if line.startswith('#'):
+            _parse_options(line, options)
+            continue
+        data_lines.append(line)
+
+    columns = 1 + 2 * ports * ports
+    data = np.array(' '.join(data_lines).split(), dtype=float).reshape(-1, columns).T
+
+    freqs = data[0] * freq_units[options['unit']]
+    mags = _to_db(data[1::2], data[2::2], options['format'])
+    return freqs, mags, options
+
+
+def _read_cache(path, codes, mtimes):
+    try:
+        with np.load(path) as cache:
+            if np.array_equal(cache['codes'], codes) and np.array_equal(cache['mtimes'], mtimes):
+                return cache['freqs'], cache['mags']
+    except (OSError, KeyError, ValueError):
+        pass
+    return None
+
+
+def _write_cache(path, codes, mtimes, freqs, mags):
+    try:
+        with open(path, mode='wb') as f:
+            np.savez(f, codes=codes, mtimes=mtimes, freqs=freqs, mags=mags)
+    except OSError as ex:
+        print('could not write adjust set cache:', ex)
+
+
+def load_adjust_set(directory, codes, workers=8):
+    # returns frequencies and (states x params x points) magnitudes for s{code}.s2p files in `directory`,
+    # the parsed set is cached next to the files and reused while file modification times stay the same
+    paths = [os.path.join(directory, f's{code}.s2p') for code in codes]
+    codes = np.asarray(codes)
+    mtimes = np.array([os.stat(p).st_mtime_ns for p in paths], dtype=np.int64)
+
+    cache_path = os.path.join(directory, cache_name)
+    cached = _read_cache(cache_path, codes, mtimes)
+    if cached is not None:
+        return cached
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parsed = list(pool.map(read_touchstone, paths))
+
+    freqs = parsed[0][0]
+    mags = np.array([m for _, m, _ in parsed])
+
+    _write_cache(cache_path, codes, mtimes, freqs, mags)
+    return freqs, mags
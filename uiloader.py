@@ -0,0 +1,37 @@
+import importlib
+import os
+
+
+def load_ui(name, widget):
+    # uses the ui_<name>.py module precompiled by install.py when it is not older than <name>.ui,
+    # falls back to parsing the .ui file at runtime
+    ui_path = f'{name}.ui'
+    try:
+        module = importlib.import_module(f'ui_{name}')
+    except ImportError:
+        module = None
+
+    if module is not None and not _is_stale(module, ui_path):
+        ui_class = next(getattr(module, attr) for attr in dir(module) if attr.startswith('Ui_'))
+        ui = ui_class()
+        ui.setupUi(widget)
+        return ui
+
+    from PyQt5 import uic
+    return uic.loadUi(ui_path, widget)
+
+
+def _is_stale(module, ui_path):
+    source = getattr(module, '__file__', None)
+    if not source or not os.path.isfile(ui_path):
+        return False
+    return os.path.getmtime(ui_path) > os.path.getmtime(source)
+
+
+def compile_all(names, out_dir='.'):
+    from PyQt5 import uic
+    for name in names:
+        with open(f'{name}.ui', mode='rt', encoding='utf-8') as src, \
+                open(os.path.join(out_dir, f'ui_{name}.py'), mode='wt', encoding='utf-8') as dst:
+            uic.compileUi(src, dst)
+        print(f'compiled {name}.ui')